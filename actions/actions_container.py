@@ -1,26 +1,258 @@
-from typing import Dict, Any, Optional
+import copy
+import hashlib
+import inspect
+import json
+import math
+import re
+import threading
+import time
+import typing
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List, Mapping, Optional, Tuple
 from attrs import define
 
 from actions.ollama_agent_actions import BaseAction, FileOperationAction, RunCommandAction, SystemInfoAction
 
 
+_JSON_TYPES = {str: "string", bool: "boolean", int: "integer", float: "number", list: "array", dict: "object"}
+
+
+def _json_type(annotation: Any) -> Dict[str, Any]:
+    """Map a type hint to a JSON schema fragment."""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        # Optional[X] -> X
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _json_type(args[0]) if len(args) == 1 else {}
+    if origin in (list, List):
+        args = typing.get_args(annotation)
+        return {"type": "array", "items": _json_type(args[0]) if args else {}}
+    if origin in (dict, Dict):
+        return {"type": "object"}
+    json_type = _JSON_TYPES.get(annotation)
+    return {"type": json_type} if json_type else {}
+
+
+def action_schema(action: BaseAction) -> Dict[str, Any]:
+    """Build a native tool-calling schema from an action's execute signature."""
+    hints = typing.get_type_hints(action.execute)
+    metadata = action.parameter_metadata()
+    properties = {}
+    required = []
+    for name, parameter in inspect.signature(action.execute).parameters.items():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        properties[name] = dict(_json_type(hints.get(name, Any)), **metadata.get(name, {}))
+        if parameter.default is parameter.empty:
+            required.append(name)
+        elif parameter.default is not None:
+            properties[name]["default"] = parameter.default
+    return {
+        "type": "function",
+        "function": {
+            "name": action.name,
+            "description": action.description,
+            "parameters": {"type": "object", "properties": properties, "required": required},
+        },
+    }
+
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from how i in is it me my of on or please "
+    "the this to what with you your".split()
+)
+
+
+def _tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with a naive plural/-ing strip, minus stopwords."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 5 and word.endswith("ing"):
+            word = word[:-3]
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+@define
+class FindActionsAction(BaseAction):
+    """Action that lets the model discover actions not offered this turn."""
+    name: str = "find_actions"
+    description: str = "Searches for more available actions by keywords when none of the offered tools fit"
+    registry: Any = None
+
+    def parameter_metadata(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "query": {"description": "Keywords describing the needed action"},
+            "limit": {"minimum": 1},
+        }
+
+    def execute(self, query: str, limit: int = 5) -> Dict[str, Any]:
+        names = self.registry.select_actions(query, limit)
+        descriptions = self.registry.list_actions()
+        return {
+            "success": True,
+            "actions": [{"name": name, "description": descriptions[name]} for name in names]
+        }
+
+
 class ActionRegistry:
     """Registry for available agent actions."""
     
-    def __init__(self):
+    def __init__(self, max_cached_results: int = 256):
         self._actions: Dict[str, BaseAction] = {}
+        # Actions registered by description only, instantiated on first use
+        self._loaders: Dict[str, Callable[[], BaseAction]] = {}
+        # Guards registration against lookups from concurrent daemon sessions
+        self._lock = threading.RLock()
+        # Derived views, rebuilt only when an action is registered. The descriptions
+        # dict is replaced rather than mutated, so views handed out stay consistent
+        self._descriptions: Dict[str, str] = {}
+        self._tool_names: frozenset = frozenset()
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._dispatch: Dict[str, tuple] = {}
+        # Keyword index over names and descriptions: term -> {action: term count}
+        self._index: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        # Results of idempotent calls: (action, cache key) -> (time, result), least recent first
+        self._results: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._results_lock = threading.Lock()
+        self.max_cached_results = max_cached_results
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.finder = FindActionsAction(registry=self)
+        self._add_to_views(self.finder)
+        self._tool_names = frozenset({self.finder.name})
+    
+    def _add_to_views(self, action: BaseAction) -> None:
+        schema = action_schema(action)
+        self._schemas[action.name] = schema
+        parameters = frozenset(schema["function"]["parameters"]["properties"])
+        self._dispatch[action.name] = (action, parameters)
+    
+    def _index_action(self, name: str, description: str) -> None:
+        self._descriptions = dict(self._descriptions, **{name: description})
+        self._tool_names = frozenset(self._descriptions) | {self.finder.name}
+        for postings in self._index.values():
+            postings.pop(name, None)
+        tokens = _tokenize(name.replace("_", " ")) + _tokenize(description)
+        for token in tokens:
+            postings = self._index.setdefault(token, {})
+            postings[name] = postings.get(name, 0) + 1
+        self._doc_lengths[name] = len(tokens)
         
     def register(self, action: BaseAction) -> None:
         """Register an action with the registry."""
-        self._actions[action.name] = action
+        with self._lock:
+            self._actions[action.name] = action
+            self._loaders.pop(action.name, None)
+            self.clear_cache(action.name)
+            self._add_to_views(action)
+            self._index_action(action.name, action.description)
+    
+    def register_lazy(self, name: str, description: str, loader: Callable[[], BaseAction]) -> None:
+        """Register an action by name and description; ``loader`` builds it on first use."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._index_action(name, description)
+    
+    def _load(self, name: str) -> bool:
+        with self._lock:
+            loader = self._loaders.get(name)
+            if loader is None:
+                return name in self._actions or name == self.finder.name
+            self.register(loader())
+            return True
         
     def get_action(self, name: str) -> Optional[BaseAction]:
         """Get an action by name."""
+        if name == self.finder.name:
+            return self.finder
+        if name in self._loaders:
+            self._load(name)
         return self._actions.get(name)
     
-    def list_actions(self) -> Dict[str, str]:
-        """List all available actions and their descriptions."""
-        return {name: action.description for name, action in self._actions.items()}
+    def tool_names(self) -> frozenset:
+        """Names that can be called, including lazy actions and find_actions."""
+        return self._tool_names
+    
+    def list_actions(self) -> Mapping[str, str]:
+        """List all available actions and their descriptions (a read-only view)."""
+        return MappingProxyType(self._descriptions)
+    
+    def select_actions(self, query: str, k: int = 5) -> List[str]:
+        """Return up to ``k`` action names ranked by BM25 relevance to ``query``."""
+        scores: Dict[str, float] = {}
+        with self._lock:
+            total = len(self._doc_lengths)
+            if not total:
+                return []
+            average_length = sum(self._doc_lengths.values()) / total
+            for token in set(_tokenize(query)):
+                postings = self._index.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for name, count in postings.items():
+                    length_norm = 1 - 0.75 + 0.75 * self._doc_lengths[name] / average_length
+                    scores[name] = scores.get(name, 0.0) + idf * count * 2.2 / (count + 1.2 * length_norm)
+        ranked = sorted(scores, key=lambda name: scores[name], reverse=True)
+        return ranked[:k]
+    
+    def tool_schemas(self, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Native tool-calling schemas for the given actions, or for all of them."""
+        if names is None:
+            names = list(self._descriptions)
+        schemas = []
+        for name in names:
+            if self._load(name) and name in self._schemas:
+                schemas.append(self._schemas[name])
+        return schemas
+    
+    def clear_cache(self, name: Optional[str] = None) -> None:
+        """Drop cached results of one action, or of all actions."""
+        with self._results_lock:
+            for key in list(self._results):
+                if name is None or key[0] == name:
+                    del self._results[key]
+    
+    def _run(self, action: BaseAction, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute an action, reusing the cached result of an identical idempotent call.
+        
+        Cacheable results carry a ``result_id`` derived from their content, so
+        callers can recognise a result they have already seen.
+        """
+        try:
+            key = action.cache_key(*args, **kwargs)
+        except TypeError:
+            key = None  # Let execute report the bad arguments
+        if key is None:
+            return action.execute(*args, **kwargs)
+        
+        cache_key = (action.name, key)
+        now = time.monotonic()
+        with self._results_lock:
+            entry = self._results.get(cache_key)
+            if entry is not None and (action.cache_ttl is None or now - entry[0] < action.cache_ttl):
+                self._results.move_to_end(cache_key)
+                self.cache_stats["hits"] += 1
+                return copy.deepcopy(entry[1])
+            self.cache_stats["misses"] += 1
+        
+        result = action.execute(*args, **kwargs)
+        if not result.get("success"):
+            return result
+        digest = hashlib.sha256(json.dumps(result, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        result["result_id"] = f"{action.name}:{digest[:10]}"
+        with self._results_lock:
+            self._results[cache_key] = (now, result)
+            self._results.move_to_end(cache_key)
+            while len(self._results) > self.max_cached_results:
+                self._results.popitem(last=False)
+        return copy.deepcopy(result)
     
     def execute_action(self, name: str, *args, **kwargs) -> Dict[str, Any]:
         """Execute an action by name."""
@@ -28,7 +260,39 @@ class ActionRegistry:
         if not action:
             return {"success": False, "error": f"Action '{name}' not found"}
             
-        return action.execute(*args, **kwargs)
+        return self._run(action, args, kwargs)
+    
+    def dispatch_tool_call(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a native tool call of the form {"function": {"name", "arguments"}}."""
+        function = tool_call.get("function")
+        if not isinstance(function, dict):
+            return {"success": False, "error": "Tool call has no function"}
+        name = function.get("name")
+        entry = self._dispatch.get(name)
+        if entry is None and self._load(name):
+            entry = self._dispatch.get(name)
+        if entry is None:
+            return {"success": False, "error": f"Action '{name}' not found"}
+        action, parameters = entry
+
+        arguments = function.get("arguments") or {}
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except json.JSONDecodeError:
+                return {"success": False, "error": f"Invalid arguments for '{name}'"}
+        if arguments is None:
+            arguments = {}
+        if not isinstance(arguments, dict):
+            return {"success": False, "error": f"Arguments for '{name}' must be a JSON object"}
+        unknown = set(arguments) - parameters
+        if unknown:
+            return {"success": False, "error": f"Unknown arguments for '{name}': {', '.join(sorted(unknown))}"}
+        try:
+            return self._run(action, (), arguments)
+        except Exception as e:
+            # Arguments come from the model; a bad call must not take the agent down
+            return {"success": False, "error": f"Error executing '{name}': {e}"}
     
 
 
@@ -0,0 +1,212 @@
+"""
+Fix Cache
+This module keeps a local index of command failures mapped to the fixes that
+resolved them, so recurring errors can be repaired without asking the LLM.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from attrs import define, field
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; saves are then only serialized in-process
+    fcntl = None
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".lazyme", "fix_cache.json")
+
+# Volatile fragments of error output that should not make two errors look different
+_NORMALIZERS = [
+    (re.compile(r"0x[0-9a-f]+"), "<hex>"),
+    (re.compile(r"(?:[a-z]:)?(?:[\\/][\w.\-@+~]+)+[\\/]?"), "<path>"),
+    (re.compile(r"\b\d+(?:\.\d+)+\b"), "<version>"),
+    (re.compile(r"\b\d+\b"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+_ERROR_LINE = re.compile(r"error|denied|not found|no such|cannot|could not|failed|missing|unable", re.IGNORECASE)
+_MAX_SIGNATURE_LINES = 3
+
+
+def normalize_error(text: str) -> str:
+    """Reduce error output to a stable, comparable form."""
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    # Prefer lines that actually describe the error, which usually come last
+    relevant = [line for line in lines if _ERROR_LINE.search(line)] or lines
+    normalized = " | ".join(relevant[-_MAX_SIGNATURE_LINES:]).lower()
+    for pattern, replacement in _NORMALIZERS:
+        normalized = pattern.sub(replacement, normalized)
+    return normalized.strip()
+
+
+def error_signature(result: Dict[str, Any]) -> Optional[str]:
+    """Build a signature from a RunCommandAction result, or None if it succeeded."""
+    exit_code = result.get("exit_code")
+    failed = not result.get("success", False) or (exit_code not in (None, 0))
+    if not failed:
+        return None
+
+    text = result.get("stderr") or result.get("error") or result.get("stdout") or ""
+    normalized = normalize_error(text)
+    raw = f"{exit_code}:{normalized}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _locked(lock_path: str) -> Iterator[None]:
+    """Hold an exclusive advisory lock on ``lock_path`` across processes."""
+    with open(lock_path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+@define
+class FixCandidate:
+    """A fix that has been tried for an error signature."""
+    commands: List[str]
+    successes: int = 0
+    failures: int = 0
+
+    @property
+    def attempts(self) -> int:
+        return self.successes + self.failures
+
+    @property
+    def success_rate(self) -> float:
+        # Laplace smoothing keeps a single lucky success from dominating
+        return (self.successes + 1) / (self.attempts + 2)
+
+
+@define
+class FixCache:
+    """Local index of normalized error signatures mapped to known fixes."""
+    path: Optional[str] = DEFAULT_CACHE_PATH
+    min_success_rate: float = 0.5
+    _index: Dict[str, Dict[str, FixCandidate]] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+    # Outcomes recorded since the last save: (signature, fix key) -> [commands, successes, failures]
+    _pending: Dict[Tuple[str, str], List[Any]] = field(factory=dict, init=False)
+
+    def __attrs_post_init__(self):
+        self.load()
+
+    @staticmethod
+    def _fix_key(commands: List[str]) -> str:
+        return "\n".join(command.strip() for command in commands)
+
+    def _read(self) -> Dict[str, Dict[str, FixCandidate]]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as file:
+                raw = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return {
+            signature: {key: FixCandidate(**candidate) for key, candidate in fixes.items()}
+            for signature, fixes in raw.items()
+        }
+
+    def load(self) -> None:
+        """Load the index from disk, if present."""
+        index = self._read()
+        with self._lock:
+            self._index = index
+
+    def save(self) -> None:
+        """Merge outcomes recorded since the last save into the index on disk.
+
+        The file is re-read under an exclusive lock, so processes sharing the
+        cache add to each other's counts instead of overwriting them.
+        """
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, _locked(f"{self.path}.lock"):
+            index = self._read()
+            for (signature, key), (commands, successes, failures) in self._pending.items():
+                candidate = index.setdefault(signature, {}).setdefault(key, FixCandidate(commands=commands))
+                candidate.successes += successes
+                candidate.failures += failures
+            raw = {
+                signature: {
+                    key: {"commands": c.commands, "successes": c.successes, "failures": c.failures}
+                    for key, c in fixes.items()
+                }
+                for signature, fixes in index.items()
+            }
+            # Write a temp file and swap it in, so readers never see a partial index
+            fd, tmp_path = tempfile.mkstemp(prefix=".fix_cache-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump(raw, file, indent=2)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            self._pending = {}
+            self._index = index
+
+    def lookup(self, result: Dict[str, Any]) -> List[FixCandidate]:
+        """Return known fixes for a failed result, best success rate first."""
+        signature = error_signature(result)
+        if signature is None:
+            return []
+        with self._lock:
+            candidates = list(self._index.get(signature, {}).values())
+        candidates = [c for c in candidates if c.success_rate >= self.min_success_rate]
+        return sorted(candidates, key=lambda c: (c.success_rate, c.successes), reverse=True)
+
+    def record(self, result: Dict[str, Any], commands: List[str], succeeded: bool) -> None:
+        """Record the outcome of applying ``commands`` to the failure in ``result``."""
+        signature = error_signature(result)
+        if signature is None or not commands:
+            return
+        key = self._fix_key(commands)
+        with self._lock:
+            fixes = self._index.setdefault(signature, {})
+            candidate = fixes.get(key)
+            if candidate is None:
+                candidate = fixes[key] = FixCandidate(commands=list(commands))
+            pending = self._pending.setdefault((signature, key), [list(commands), 0, 0])
+            if succeeded:
+                candidate.successes += 1
+                pending[1] += 1
+            else:
+                candidate.failures += 1
+                pending[2] += 1
+        self.save()
+
+    def resolve(self, result: Dict[str, Any],
+                apply_fix: Callable[[List[str]], bool],
+                ask_llm: Callable[[Dict[str, Any]], List[str]]) -> Dict[str, Any]:
+        """Try cached fixes for a failure before falling back to the LLM.
+
+        ``apply_fix`` runs the fix commands and reports whether the original
+        problem is gone; ``ask_llm`` returns new fix commands for the failure.
+        """
+        for candidate in self.lookup(result):
+            succeeded = apply_fix(candidate.commands)
+            self.record(result, candidate.commands, succeeded)
+            if succeeded:
+                return {"success": True, "source": "cache", "commands": candidate.commands}
+
+        commands = ask_llm(result)
+        if not commands:
+            return {"success": False, "source": "llm", "error": "No fix suggested"}
+        succeeded = apply_fix(commands)
+        self.record(result, commands, succeeded)
+        return {"success": succeeded, "source": "llm", "commands": commands}
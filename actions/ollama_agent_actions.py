@@ -3,11 +3,14 @@ Ollama Agent Actions
 This module provides action classes for the Ollama-based agent to perform specific tasks.
 """
 
+import json
 import os
+import shutil
 import subprocess
 import platform
-from typing import Dict, Any, List
-from attrs import define
+import time
+from typing import Dict, Any, List, Optional
+from attrs import define, field
 
 
 @define
@@ -15,33 +18,210 @@ class BaseAction:
     """Base class for all agent actions."""
     name: str
     description: str
+    # Idempotent actions return the same result for the same arguments and state,
+    # so the registry may reuse their results
+    idempotent: bool = False
+    cache_ttl: Optional[float] = None  # Seconds a cached result stays valid; None for no limit
     
     def execute(self, *args, **kwargs) -> Dict[str, Any]:
         """Execute the action and return results."""
         raise NotImplementedError("Subclasses must implement execute method")
+    
+    def parameter_metadata(self) -> Dict[str, Dict[str, Any]]:
+        """Extra JSON schema fields per execute parameter, e.g. ``enum`` or ``description``."""
+        return {}
+    
+    def cache_key(self, *args, **kwargs) -> Optional[str]:
+        """Key identifying the result of a call, or None if it must not be cached."""
+        if not self.idempotent:
+            return None
+        return json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+def _read_meminfo() -> Dict[str, int]:
+    """Read /proc/meminfo into a dict of byte counts."""
+    meminfo = {}
+    with open("/proc/meminfo", "r") as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            parts = value.split()
+            if parts:
+                # Values are reported in kB
+                meminfo[key] = int(parts[0]) * 1024
+    return meminfo
+
+
+def _probe_processor() -> str:
+    """Return the CPU model name without spawning a subprocess."""
+    try:
+        with open("/proc/cpuinfo", "r") as file:
+            for line in file:
+                if line.startswith("model name"):
+                    return line.partition(":")[2].strip()
+    except OSError:
+        pass
+    return platform.machine()
+
+
+def probe_cpu() -> Dict[str, Any]:
+    """Collect logical and usable CPU counts."""
+    logical = os.cpu_count() or 1
+    try:
+        usable = len(os.sched_getaffinity(0))
+    except AttributeError:
+        usable = logical
+    return {"logical": logical, "usable": usable}
+
+
+def probe_memory() -> Dict[str, Any]:
+    """Collect total and available memory in bytes."""
+    try:
+        meminfo = _read_meminfo()
+        total = meminfo.get("MemTotal", 0)
+        available = meminfo.get("MemAvailable", meminfo.get("MemFree", 0))
+    except OSError:
+        try:
+            page_size = os.sysconf("SC_PAGE_SIZE")
+            total = os.sysconf("SC_PHYS_PAGES") * page_size
+            available = os.sysconf("SC_AVPHYS_PAGES") * page_size
+        except (ValueError, OSError, AttributeError):
+            total = available = 0
+    return {"total": total, "available": available}
+
+
+def probe_disk(path: str = os.sep) -> Dict[str, Any]:
+    """Collect disk usage in bytes for the filesystem holding ``path``."""
+    usage = shutil.disk_usage(path)
+    return {"path": path, "total": usage.total, "used": usage.used, "free": usage.free}
+
+
+def probe_load() -> Dict[str, Any]:
+    """Collect 1/5/15 minute load averages, if the platform provides them."""
+    try:
+        load1, load5, load15 = os.getloadavg()
+    except (AttributeError, OSError):
+        return {"load1": None, "load5": None, "load15": None}
+    return {"load1": load1, "load5": load5, "load15": load15}
+
+
+GIB = 1024 ** 3
 
 
 @define
 class SystemInfoAction(BaseAction):
     """Action to collect system information."""
     name: str = "system_info"
-    description: str = "Collects information about the current system"
-    
-    def execute(self) -> Dict[str, Any]:
-        system_info = {
-            "platform": platform.system(),
-            "platform_release": platform.release(),
-            "platform_version": platform.version(),
-            "architecture": platform.machine(),
-            "processor": platform.processor(),
-            "hostname": platform.node(),
+    description: str = ("Collects information about the current system (CPU, memory, disk, load) "
+                        "and optionally checks it against hardware requirement profiles")
+    idempotent: bool = True
+    cache_ttl: float = 5.0
+    disk_path: str = os.sep
+    _snapshot: Optional[Dict[str, Any]] = field(default=None, init=False)
+    _snapshot_time: float = field(default=0.0, init=False)
+
+    def snapshot(self, refresh: bool = False) -> Dict[str, Any]:
+        """Return system information, reusing a snapshot younger than ``cache_ttl``."""
+        now = time.monotonic()
+        if not refresh and self._snapshot is not None and now - self._snapshot_time < self.cache_ttl:
+            return self._snapshot
+
+        uname = platform.uname()
+        self._snapshot = {
+            "platform": uname.system,
+            "platform_release": uname.release,
+            "platform_version": uname.version,
+            "architecture": uname.machine,
+            "processor": _probe_processor(),
+            "hostname": uname.node,
             "python_version": platform.python_version(),
+            "cpu": probe_cpu(),
+            "memory": probe_memory(),
+            "disk": probe_disk(self.disk_path),
+            "load": probe_load(),
         }
-        
+        self._snapshot_time = now
+        return self._snapshot
+
+    def check_requirements(self, profiles: List[Dict[str, Any]], refresh: bool = False) -> List[Dict[str, Any]]:
+        """Check many requirement profiles against a single snapshot.
+
+        Each profile may set ``cpu_count``, ``memory_gb``, ``disk_gb`` and
+        ``max_load`` (1-minute load per usable CPU); missing keys are ignored.
+        Profiles that are not objects, or have non-numeric limits, are
+        reported as invalid rather than checked.
+        """
+        info = self.snapshot(refresh=refresh)
+        cpus = info["cpu"]["usable"]
+        load1 = info["load"]["load1"]
+        # Resolve the available values once and compare every profile against them
+        available = {
+            "cpu_count": cpus,
+            "memory_gb": info["memory"]["available"] / GIB,
+            "disk_gb": info["disk"]["free"] / GIB,
+            "max_load": load1 / cpus if load1 is not None else None,
+        }
+        upper_bounds = {"max_load"}
+
+        results = []
+        for index, profile in enumerate(profiles):
+            if not isinstance(profile, dict):
+                results.append({
+                    "name": f"profile_{index}",
+                    "satisfied": False,
+                    "error": "Profile must be an object of requirement limits",
+                })
+                continue
+            invalid = [
+                key for key, required in profile.items()
+                if key in available and (isinstance(required, bool) or not isinstance(required, (int, float)))
+            ]
+            if invalid:
+                results.append({
+                    "name": str(profile.get("name", f"profile_{index}")),
+                    "satisfied": False,
+                    "error": f"Non-numeric requirement values: {', '.join(invalid)}",
+                })
+                continue
+            missing = {}
+            for key, required in profile.items():
+                if key not in available or available[key] is None:
+                    continue
+                have = available[key]
+                ok = have <= required if key in upper_bounds else have >= required
+                if not ok:
+                    missing[key] = {"required": required, "available": round(have, 2)}
+            results.append({
+                "name": profile.get("name", f"profile_{index}"),
+                "satisfied": not missing,
+                "missing": missing,
+            })
+        return results
+
+    def parameter_metadata(self) -> Dict[str, Dict[str, Any]]:
         return {
+            "refresh": {"description": "Collect fresh data instead of reusing a recent snapshot"},
+            "requirements": {
+                "description": "Hardware profiles to check, each with optional "
+                               "cpu_count, memory_gb, disk_gb and max_load",
+                "items": {"type": "object"},
+            },
+        }
+
+    def cache_key(self, refresh: bool = False, requirements: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+        if refresh:
+            return None
+        return super().cache_key(requirements=requirements)
+
+    def execute(self, refresh: bool = False, requirements: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        result = {
             "success": True,
-            "data": system_info
+            "data": self.snapshot(refresh=refresh)
         }
+        if isinstance(requirements, dict):
+            requirements = [requirements]  # A single profile passed on its own
+        if requirements:
+            result["requirements"] = self.check_requirements(requirements)
+        return result
 
 
 @define
@@ -62,6 +242,9 @@ class RunCommandAction(BaseAction):
         # Base command check
         return command_base in [cmd.split()[0].lower() for cmd in self.allowed_commands]
     
+    def parameter_metadata(self) -> Dict[str, Dict[str, Any]]:
+        return {"command": {"description": "Command line to run; must start with an allowed command"}}
+    
     def execute(self, command: str) -> Dict[str, Any]:
         """Execute a shell command."""
         if not self.is_command_allowed(command):
@@ -103,6 +286,25 @@ class FileOperationAction(BaseAction):
     name: str = "file_operation"
     description: str = "Performs basic file operations like reading, listing directories"
     base_dir: str = os.getcwd()  # Restrict to current directory for safety
+    idempotent: bool = True
+    
+    def parameter_metadata(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "operation": {"enum": ["read", "list", "write"]},
+            "file_path": {"description": "Path relative to the base directory"},
+            "content": {"description": "Text to write; only used by 'write'"},
+        }
+    
+    def cache_key(self, operation: str, file_path: str = "", content: str = "") -> Optional[str]:
+        """Reads and listings are keyed on the target's mtime and size; writes are never cached."""
+        if operation not in ("read", "list"):
+            return None
+        target_path = os.path.normpath(os.path.join(self.base_dir, file_path))
+        try:
+            stat = os.stat(target_path)
+        except OSError:
+            return None
+        return f"{operation}:{target_path}:{stat.st_mtime_ns}:{stat.st_size}"
     
     def execute(self, operation: str, file_path: str = "", content: str = "") -> Dict[str, Any]:
         """Execute a file operation."""
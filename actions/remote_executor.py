@@ -0,0 +1,316 @@
+"""
+Remote Executor
+This module runs a command plan across many hosts concurrently.
+
+Transports hide how a command reaches a host (SSH, a local subprocess or a
+container), so the fan-out logic can be exercised without real machines.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+from attrs import define, field
+
+
+OutputCallback = Callable[[str, str, str], Optional[Awaitable[None]]]
+
+READ_CHUNK_SIZE = 65536
+# ControlMaster sockets accept commands from whoever can reach them, so keep them private
+DEFAULT_CONTROL_DIR = os.path.join(os.path.expanduser("~"), ".lazyme", "ssh")
+
+
+@define
+class CommandResult:
+    """Outcome of a single command on a single host."""
+    host: str
+    command: str
+    exit_code: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None and self.exit_code == 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "success": self.success,
+            "command": self.command,
+            "exit_code": self.exit_code,
+            "stdout": self.stdout,
+            "stderr": self.stderr,
+            "duration": round(self.duration, 3),
+        }
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+@define
+class BaseTransport:
+    """Base class for the channel used to reach a single host."""
+    host: str
+
+    def build_argv(self, command: str) -> List[str]:
+        """Return the argv that runs ``command`` on the host."""
+        raise NotImplementedError("Subclasses must implement build_argv method")
+
+    async def connect(self) -> None:
+        """Open (or warm up) the connection to the host."""
+
+    async def close(self) -> None:
+        """Release the connection to the host."""
+
+    async def run(self, command: str, timeout: float, on_output: Optional[OutputCallback] = None) -> CommandResult:
+        """Run a command on the host, streaming output lines to ``on_output``."""
+        started = time.monotonic()
+        result = CommandResult(host=self.host, command=command)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.build_argv(command),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+        except Exception as e:
+            result.error = str(e)
+            result.duration = time.monotonic() - started
+            return result
+
+        async def emit(stream_name: str, raw_line: bytes, chunks: List[str]) -> None:
+            line = raw_line.decode(errors="replace")
+            chunks.append(line)
+            if on_output:
+                maybe_awaitable = on_output(self.host, stream_name, line)
+                if asyncio.iscoroutine(maybe_awaitable):
+                    await maybe_awaitable
+
+        async def pump(stream, stream_name: str, chunks: List[str]) -> None:
+            # Read fixed-size chunks: line iteration fails on lines over the reader's 64 KiB limit
+            pending = b""
+            while True:
+                data = await stream.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                pending += data
+                *lines, pending = pending.split(b"\n")
+                for raw_line in lines:
+                    await emit(stream_name, raw_line + b"\n", chunks)
+            if pending:
+                await emit(stream_name, pending, chunks)
+
+        def kill() -> None:
+            # Kill the whole process group so shell children release the pipes
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        stdout_chunks: List[str] = []
+        stderr_chunks: List[str] = []
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    pump(process.stdout, "stdout", stdout_chunks),
+                    pump(process.stderr, "stderr", stderr_chunks),
+                    process.wait(),
+                ),
+                timeout=timeout,
+            )
+            result.exit_code = process.returncode
+        except asyncio.TimeoutError:
+            kill()
+            await process.wait()
+            result.exit_code = process.returncode
+            result.error = "Command execution timed out"
+        except BaseException as e:
+            kill()
+            await process.wait()
+            result.exit_code = process.returncode
+            if not isinstance(e, Exception):
+                raise  # Cancellation and interrupts still propagate, without leaking the process
+            result.error = f"Command execution failed: {e}"
+
+        result.stdout = "".join(stdout_chunks)
+        result.stderr = "".join(stderr_chunks)
+        result.duration = time.monotonic() - started
+        return result
+
+
+@define
+class LocalTransport(BaseTransport):
+    """Runs commands in a local shell; useful as a stand-in for real hosts."""
+    shell: str = "/bin/sh"
+
+    def build_argv(self, command: str) -> List[str]:
+        return [self.shell, "-c", command]
+
+
+@define
+class ContainerTransport(BaseTransport):
+    """Runs commands inside a running container via ``docker exec``."""
+    container: str = ""
+    engine: str = "docker"
+
+    def build_argv(self, command: str) -> List[str]:
+        return [self.engine, "exec", self.container or self.host, "/bin/sh", "-c", command]
+
+
+@define
+class SSHTransport(BaseTransport):
+    """Runs commands over SSH, reusing one multiplexed connection per host."""
+    user: Optional[str] = None
+    port: int = 22
+    identity_file: Optional[str] = None
+    control_dir: str = DEFAULT_CONTROL_DIR
+    persist_seconds: int = 300
+    extra_options: List[str] = field(factory=list)
+
+    @property
+    def target(self) -> str:
+        return f"{self.user}@{self.host}" if self.user else self.host
+
+    @property
+    def control_path(self) -> str:
+        return f"{self.control_dir}/lazyme-ssh-%r@%h:%p"
+
+    def _base_argv(self) -> List[str]:
+        argv = [
+            "ssh",
+            "-p", str(self.port),
+            "-o", "BatchMode=yes",
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={self.control_path}",
+            "-o", f"ControlPersist={self.persist_seconds}",
+        ]
+        if self.identity_file:
+            argv += ["-i", self.identity_file]
+        return argv + list(self.extra_options)
+
+    def build_argv(self, command: str) -> List[str]:
+        return self._base_argv() + [self.target, command]
+
+    def _ensure_control_dir(self) -> None:
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+        if not hasattr(os, "getuid"):  # No POSIX ownership to check on Windows
+            return
+        info = os.stat(self.control_dir)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f"SSH control directory {self.control_dir} must be private (0700) to this user")
+
+    async def connect(self) -> None:
+        self._ensure_control_dir()
+        # Start the master connection up front so every command reuses it
+        process = await asyncio.create_subprocess_exec(
+            *self._base_argv(), "-N", "-f", self.target,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            message = stderr.decode(errors="replace").strip() or f"ssh exited with {process.returncode}"
+            raise ConnectionError(message)
+
+    async def close(self) -> None:
+        process = await asyncio.create_subprocess_exec(
+            *self._base_argv(), "-O", "exit", self.target,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        await process.wait()
+
+
+TransportFactory = Callable[[str], BaseTransport]
+
+
+@define
+class FanOutExecutor:
+    """Runs a command plan on many hosts at once.
+
+    Commands run in order on each host and stop at the first failure unless
+    ``stop_on_error`` is disabled; hosts are processed concurrently up to
+    ``max_concurrency``.
+    """
+    transport_factory: TransportFactory = LocalTransport
+    max_concurrency: int = 10
+    command_timeout: float = 300.0
+    stop_on_error: bool = True
+    _transports: Dict[str, BaseTransport] = field(factory=dict, init=False)
+
+    async def get_transport(self, host: str) -> BaseTransport:
+        """Return the cached transport for a host, connecting it on first use."""
+        transport = self._transports.get(host)
+        if transport is None:
+            transport = self.transport_factory(host)
+            await transport.connect()
+            self._transports[host] = transport
+        return transport
+
+    async def _run_host(self, host: str, commands: List[str], semaphore: asyncio.Semaphore,
+                        on_output: Optional[OutputCallback]) -> Dict[str, Any]:
+        results: List[CommandResult] = []
+        async with semaphore:
+            try:
+                transport = await self.get_transport(host)
+            except Exception as e:
+                return {"success": False, "error": f"Connection failed: {e}", "results": []}
+
+            for command in commands:
+                try:
+                    result = await transport.run(command, self.command_timeout, on_output)
+                except Exception as e:
+                    # One host's failure must not abort the fan-out for the others
+                    result = CommandResult(host=host, command=command, error=str(e))
+                results.append(result)
+                if not result.success and self.stop_on_error:
+                    break
+
+        return {
+            "success": len(results) == len(commands) and all(r.success for r in results),
+            "results": [r.to_dict() for r in results],
+        }
+
+    async def run(self, hosts: List[str], commands: List[str],
+                  on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Run ``commands`` on every host and aggregate the per-host results."""
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        outcomes = await asyncio.gather(
+            *(self._run_host(host, commands, semaphore, on_output) for host in hosts),
+            return_exceptions=True,
+        )
+        per_host = {
+            host: outcome if not isinstance(outcome, BaseException)
+            else {"success": False, "error": str(outcome), "results": []}
+            for host, outcome in zip(hosts, outcomes)
+        }
+        failed = [host for host, outcome in per_host.items() if not outcome["success"]]
+        return {
+            "success": not failed,
+            "hosts": per_host,
+            "failed_hosts": failed,
+        }
+
+    async def close(self) -> None:
+        """Close every cached host connection."""
+        transports = list(self._transports.values())
+        self._transports.clear()
+        await asyncio.gather(*(t.close() for t in transports), return_exceptions=True)
+
+
+def run_plan(hosts: List[str], commands: List[str], **executor_kwargs) -> Dict[str, Any]:
+    """Synchronous helper that runs a plan and closes all connections afterwards."""
+    async def _run() -> Dict[str, Any]:
+        executor = FanOutExecutor(**executor_kwargs)
+        try:
+            return await executor.run(hosts, commands)
+        finally:
+            await executor.close()
+
+    return asyncio.run(_run())
+
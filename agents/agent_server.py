@@ -0,0 +1,352 @@
+"""
+Agent Server
+This module keeps agents, handlers and caches resident in a long-lived
+process and exposes them over a small JSON/HTTP API on a Unix socket or a
+localhost port, plus a thin client for forwarding queries to it.
+
+Every request must carry the daemon's token ("Authorization: Bearer ...")
+from a 0600 token file, a localhost Host header and, for POST, a JSON
+Content-Type, so web pages cannot drive the agent through the browser.
+
+API:
+    GET    /health                   -> status, sessions and scheduler metrics
+    POST   /sessions/<id>/query      {"message": "...", "priority": "interactive"}
+    POST   /sessions/<id>/reset      -> clears the session's conversation
+    DELETE /sessions/<id>            -> drops the session
+"""
+
+import hmac
+import http.client
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from attrs import define, field
+
+from llm_handler.scheduler import Priority, default_scheduler
+from llm_handler.single_flight import default_flights
+
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".lazyme")
+# The Unix socket is the default where available; TCP is reachable by any local process
+DEFAULT_SOCKET = os.path.join(STATE_DIR, "agent.sock") if hasattr(socket, "AF_UNIX") else None
+DEFAULT_TOKEN_FILE = os.path.join(STATE_DIR, "agent.token")
+LOCAL_HOSTS = frozenset({"localhost", "127.0.0.1", "[::1]", "::1"})
+
+
+def write_token(path: str) -> str:
+    """Create a fresh random token in a file only the current user can read."""
+    os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as file:
+        file.write(token)
+    os.chmod(path, 0o600)
+    return token
+
+
+def read_token(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as file:
+            return file.read().strip() or None
+    except OSError:
+        return None
+
+
+def _is_local_host(host_header: Optional[str]) -> bool:
+    if not host_header:
+        return False
+    host = host_header.strip().lower()
+    if host.startswith("["):
+        host = host.split("]")[0] + "]"
+    elif host.count(":") == 1:
+        host = host.split(":")[0]
+    return host in LOCAL_HOSTS
+
+
+@define
+class _Session:
+    agent: Any
+    lock: threading.Lock = field(factory=threading.Lock)
+    last_used: float = field(factory=time.monotonic)
+
+
+@define
+class SessionManager:
+    """Creates agents per session and evicts sessions that sit idle."""
+    agent_factory: Callable[[str], Any]
+    idle_timeout: float = 3600.0
+    _sessions: Dict[str, _Session] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+
+    def get(self, session_id: str) -> _Session:
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(agent=self.agent_factory(session_id))
+            session.last_used = time.monotonic()
+            return session
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_timeout and not session.lock.locked():
+                del self._sessions[session_id]
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._sessions)
+
+    def agents(self) -> Dict[str, Any]:
+        with self._lock:
+            return {session_id: session.agent for session_id, session in self._sessions.items()}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "LazyMeAgent/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Unix socket peers have no address; keep the daemon quiet either way
+        pass
+
+    def _send(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _route(self) -> Tuple[Optional[str], Optional[str]]:
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if len(parts) >= 2 and parts[0] == "sessions":
+            return unquote(parts[1]), parts[2] if len(parts) > 2 else None
+        return None, None
+
+    def _authorized(self) -> bool:
+        """Reject cross-site and rebinding attempts, then check the token."""
+        if not _is_local_host(self.headers.get("Host")):
+            self._send(403, {"error": "Host not allowed"})
+            return False
+        expected = f"Bearer {self.server.app.token}"
+        if not hmac.compare_digest(self.headers.get("Authorization", ""), expected):
+            self._send(401, {"error": "Missing or invalid token"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path.rstrip("/") == "/health":
+            self._send(200, self.server.app.health())
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send(415, {"error": "Content-Type must be application/json"})
+            return
+        session_id, action = self._route()
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON body"})
+            return
+        if not isinstance(payload, dict):
+            self._send(400, {"error": "JSON body must be an object"})
+            return
+        if session_id and action == "query":
+            status, result = self.server.app.query(session_id, payload)
+        elif session_id and action == "reset":
+            status, result = self.server.app.reset(session_id)
+        else:
+            status, result = 404, {"error": "Not found"}
+        self._send(status, result)
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        session_id, action = self._route()
+        if session_id and action is None:
+            self._send(200, {"dropped": self.server.app.sessions.drop(session_id)})
+        else:
+            self._send(404, {"error": "Not found"})
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            request, _ = super().get_request()
+            # BaseHTTPRequestHandler expects an (host, port) style client address
+            return request, ("local", 0)
+else:  # Windows builds without AF_UNIX support
+    _ThreadingUnixHTTPServer = None
+
+
+@define
+class AgentServer:
+    """Long-lived daemon that serves agent sessions over HTTP."""
+    agent_factory: Callable[[str], Any]
+    socket_path: Optional[str] = DEFAULT_SOCKET  # None serves on ``address`` over TCP
+    address: Tuple[str, int] = DEFAULT_ADDRESS
+    idle_timeout: float = 3600.0
+    token_file: str = DEFAULT_TOKEN_FILE
+    token: str = field(default="", init=False)
+    sessions: SessionManager = field(init=False)
+    _server: Optional[socketserver.BaseServer] = field(default=None, init=False)
+
+    def __attrs_post_init__(self):
+        self.sessions = SessionManager(agent_factory=self.agent_factory, idle_timeout=self.idle_timeout)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "sessions": self.sessions.session_ids(),
+            "scheduler": default_scheduler.metrics(),
+            "coalescing": dict(default_flights.stats),
+            # Cascade tier hit rates per session, for tuning the routing thresholds
+            "routing": {
+                session_id: agent.router.stats()
+                for session_id, agent in self.sessions.agents().items()
+                if getattr(agent, "router", None) is not None
+            },
+        }
+
+    def query(self, session_id: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        message = payload.get("message")
+        if not message or not isinstance(message, str):
+            return 400, {"error": "Missing 'message'"}
+        priority = payload.get("priority", "interactive")
+        if not isinstance(priority, str):
+            return 400, {"error": "'priority' must be a string"}
+        try:
+            priority = Priority[priority.upper()]
+        except KeyError:
+            return 400, {"error": f"Unknown priority: {payload['priority']}"}
+
+        session = self.sessions.get(session_id)
+        started = time.monotonic()
+        # Requests within one session are serialized to keep its history consistent
+        with session.lock:
+            session.agent.ollama.priority = priority
+            try:
+                response = session.agent.process_message(message)
+            except Exception as e:
+                return 500, {"error": str(e)}
+        return 200, {
+            "session": session_id,
+            "response": response,
+            "elapsed": round(time.monotonic() - started, 3),
+            "usage": session.agent.ollama.last_usage,
+        }
+
+    def reset(self, session_id: str) -> Tuple[int, Dict[str, Any]]:
+        session = self.sessions.get(session_id)
+        with session.lock:
+            session.agent.reset_conversation()
+        return 200, {"session": session_id, "reset": True}
+
+    def _create_server(self) -> socketserver.BaseServer:
+        if self.socket_path:
+            if _ThreadingUnixHTTPServer is None:
+                raise RuntimeError("Unix sockets are not supported on this platform; use an address instead")
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            os.makedirs(os.path.dirname(self.socket_path) or ".", exist_ok=True)
+            server = _ThreadingUnixHTTPServer(self.socket_path, _RequestHandler)
+            os.chmod(self.socket_path, 0o600)
+        else:
+            server = ThreadingHTTPServer(self.address, _RequestHandler)
+        server.app = self
+        return server
+
+    def serve_forever(self) -> None:
+        """Serve requests until interrupted."""
+        # A new token per daemon run; clients read it from the token file
+        self.token = write_token(self.token_file)
+        self._server = self._create_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+@define
+class AgentClient:
+    """Thin client that forwards queries to a running AgentServer."""
+    socket_path: Optional[str] = DEFAULT_SOCKET
+    address: Tuple[str, int] = DEFAULT_ADDRESS
+    timeout: Optional[float] = None
+    token_file: str = DEFAULT_TOKEN_FILE
+
+    def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        if self.socket_path:
+            connection = _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(*self.address, timeout=self.timeout)
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            headers = {"Authorization": f"Bearer {read_token(self.token_file) or ''}"}
+            if body is not None:
+                headers["Content-Type"] = "application/json"
+            connection.request(method, path, body=body, headers=headers)
+            return json.loads(connection.getresponse().read() or b"{}")
+        except (OSError, http.client.HTTPException) as e:
+            return {"error": f"Could not reach agent daemon: {e}"}
+        finally:
+            connection.close()
+
+    def health(self) -> Dict[str, Any]:
+        return self._request("GET", "/health")
+
+    def query(self, message: str, session: str = "default", priority: str = "interactive") -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{quote(session, safe='')}/query", {"message": message, "priority": priority})
+
+    def reset(self, session: str = "default") -> Dict[str, Any]:
+        return self._request("POST", f"/sessions/{quote(session, safe='')}/reset", {})
+
+    def drop(self, session: str = "default") -> Dict[str, Any]:
+        return self._request("DELETE", f"/sessions/{quote(session, safe='')}")
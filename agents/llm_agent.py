@@ -6,12 +6,16 @@ This script provides a command-line interface to interact with a local LLM via O
 
 import argparse
 import json
+import os
 import sys
 import re
+import time
 from typing import Optional, List, Dict, Any
 
-from llm_handler.ask_ollama import OllamaHandler
+from llm_handler.router import ModelRouter, default_tiers, validate_action_calls, validate_tool_calls
+from llm_handler.scheduler import Priority
 from actions.actions_container import default_registry
+from agents.agent_server import AgentClient, AgentServer, DEFAULT_ADDRESS, DEFAULT_SOCKET
 
 
 
@@ -22,7 +26,10 @@ class OllamaAgent:
                  model: str = "llama3",
                  system_prompt: Optional[str] = None,
                  tools: Optional[List[Dict[str, Any]]] = None):
-        self.ollama = OllamaHandler(model=model)
+        # Imported lazily so the daemon client mode does not pay for loading autogen
+        from llm_handler.ask_ollama import OllamaHandler
+
+        self.ollama = OllamaHandler(model=model, session=f"agent-{id(self)}")
         if system_prompt:
             self.ollama.system_prompt = system_prompt
         self.tools = tools or []
@@ -82,13 +89,37 @@ class ActionEnabledAgent(OllamaAgent):
         super().__init__(*args, **kwargs)
         self.action_registry = default_registry
         self.enable_actions = True
+        self.router: Optional[ModelRouter] = None
+        self.native_tools = True  # Send action schemas through the model's tool-calling API
+        self.max_tool_rounds = 5
+        # Only the most relevant actions are offered each turn once the registry grows
+        self.max_actions_per_turn = 5
+        self.loaded_actions: set = set()
+        # result_id -> time it was first shown, for results already in the history
+        self.seen_results: Dict[str, str] = {}
         
         # Add system message about available actions
+        self.add_system_message(self._actions_system_message())
+        self._actions_message = self.conversation_history[-1]
+    
+    def _actions_system_message(self, names: Optional[List[str]] = None) -> str:
+        """System prompt for the actions; the fallback format lists ``names`` (or all actions)."""
+        if self.native_tools:
+            # Action names, descriptions and parameters travel as tool schemas
+            return (
+                "You are a helpful assistant with the ability to perform actions. "
+                "When appropriate, call the provided tools to perform actions."
+            )
+        descriptions = self.action_registry.list_actions()
+        if names is None:
+            names = list(descriptions)
+        finder = self.action_registry.finder
         actions_desc = "You can use the following actions:\n"
-        for name, desc in self.action_registry.list_actions().items():
-            actions_desc += f"- {name}: {desc}\n"
-            
-        self.add_system_message(
+        for name in names:
+            desc = finder.description if name == finder.name else descriptions.get(name)
+            if desc is not None:
+                actions_desc += f"- {name}: {desc}\n"
+        return (
             "You are a helpful assistant with the ability to perform actions. "
             "When appropriate, you can perform actions by using the format: "
             "{{action_name: parameters}}. " 
@@ -96,22 +127,120 @@ class ActionEnabledAgent(OllamaAgent):
             "Always format action calls in triple backtick code blocks with json format."
         )
     
+    def reset_conversation(self) -> None:
+        """Reset the conversation history, keeping the actions system message."""
+        super().reset_conversation()
+        self.loaded_actions = set()
+        self.seen_results = {}
+        self.conversation_history.append(self._actions_message)
+    
+    def _disable_native_tools(self) -> None:
+        """Fall back to JSON-in-markdown action calls for models without tool support."""
+        self.native_tools = False
+        self._actions_message["content"] = self._actions_system_message()
+    
     def set_enable_actions(self, enable: bool):
         """Enable or disable action execution."""
         self.enable_actions = enable
+    
+    def enable_cascade(self, small_model: str, min_confidence: float = 0.6):
+        """Route requests to ``small_model`` first, escalating to the agent's model."""
+        self.router = ModelRouter(
+            ollama=self.ollama,
+            tiers=default_tiers(small_model=small_model, large_model=self.ollama.model),
+            min_confidence=min_confidence,
+        )
+    
+    def _validate_reply(self, message: Dict[str, Any]):
+        if not self.enable_actions:
+            return True, ""
+        if message.get("tool_calls"):
+            return validate_tool_calls(message["tool_calls"], self.action_registry.tool_names())
+        return validate_action_calls(message.get("content", ""), self.action_registry.tool_names())
+    
+    def _turn_actions(self) -> Optional[List[str]]:
+        """Names of the actions to offer this turn, or None to offer all of them."""
+        if len(self.action_registry.list_actions()) <= self.max_actions_per_turn:
+            return None
+        user_messages = [m for m in self.conversation_history if m["role"] == "user"]
+        query = user_messages[-1]["content"] if user_messages else ""
+        names = self.action_registry.select_actions(query, self.max_actions_per_turn)
+        names += [name for name in self.loaded_actions if name not in names]
+        # Anything else can still be discovered and loaded through find_actions
+        return names + [self.action_registry.finder.name]
+    
+    def _chat(self) -> Dict[str, Any]:
+        tools = None
+        if self.enable_actions and self.native_tools:
+            tools = self.action_registry.tool_schemas(self._turn_actions())
+        elif self.enable_actions:
+            # Without tool support the actions are listed in the system prompt; narrow it the same way
+            self._actions_message["content"] = self._actions_system_message(self._turn_actions())
+        if self.router:
+            return self.router.chat(self.conversation_history, validator=self._validate_reply, tools=tools)
+        return self.ollama.chat(messages=self.conversation_history, tools=tools)
+    
+    def _compact_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace a result already shown in this conversation with a short reference."""
+        result_id = result.get("result_id")
+        if result_id is None:
+            return result
+        since = self.seen_results.get(result_id)
+        if since is None:
+            self.seen_results[result_id] = time.strftime("%H:%M:%S")
+            return result
+        return {
+            "success": True,
+            "result_id": result_id,
+            "unchanged": True,
+            "message": f"Unchanged since {since}; see the earlier result {result_id}"
+        }
+    
+    def _run_tool_calls(self, message: Dict[str, Any]) -> None:
+        """Execute native tool calls and append their results to the history."""
+        tool_calls = message["tool_calls"]
+        for index, call in enumerate(tool_calls):
+            call.setdefault("id", f"call_{index}")
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": message.get("content", ""),
+            "tool_calls": tool_calls
+        })
+        for call in tool_calls:
+            result = self.action_registry.dispatch_tool_call(call)
+            if call.get("function", {}).get("name") == self.action_registry.finder.name and result.get("success"):
+                # Offer the discovered actions from the next round on
+                self.loaded_actions.update(action["name"] for action in result["actions"])
+            self.conversation_history.append({
+                "role": "tool",
+                "content": json.dumps(self._compact_result(result)),
+                "tool_call_id": call["id"],
+                "tool_name": call.get("function", {}).get("name")
+            })
         
     def process_message(self, user_message: str) -> str:
         """Process a user message, detect and execute actions in the response."""
         # Add the user message to the conversation history
         self.add_user_message(user_message)
         
-        # Get the LLM's response
-        response = self.ollama.chat(messages=self.conversation_history)
-        
-        if "error" in response:
-            return f"Error: {response['error']}"
+        # Get the LLM's response, executing tool calls until it answers in text
+        for _ in range(self.max_tool_rounds + 1):
+            response = self._chat()
+            
+            if "error" in response:
+                if self.native_tools and "does not support tools" in str(response["error"]):
+                    self._disable_native_tools()
+                    continue
+                return f"Error: {response['error']}"
+            
+            message = response.get("message", {})
+            if not (self.enable_actions and message.get("tool_calls")):
+                break
+            self._run_tool_calls(message)
+        else:
+            return f"Error: stopped after {self.max_tool_rounds} rounds of tool calls"
         
-        assistant_message = response.get("message", {}).get("content", "")
+        assistant_message = message.get("content", "")
         
         # Process any action calls in the response
         if self.enable_actions:
@@ -134,19 +263,22 @@ class ActionEnabledAgent(OllamaAgent):
                 action_data = json.loads(code_block)
                 
                 # Check if any key in the data matches an action name
+                actions = self.action_registry.tool_names()
                 key = action_data.get("action_type")
-                if not key or key not in self.action_registry.list_actions():
+                if not key or key not in actions:
                     for key in action_data.keys():
-                        if key in self.action_registry.list_actions():
+                        if key in actions:
                             break
                 
                 params = action_data[key]
                 
                 # Execute the action
                 result = self.action_registry.execute_action(key, **params if isinstance(params, dict) else params)
+                if key == self.action_registry.finder.name and result.get("success"):
+                    self.loaded_actions.update(action["name"] for action in result["actions"])
                 
                 # Format the result
-                result_str = json.dumps(result, indent=2)
+                result_str = json.dumps(self._compact_result(result), indent=2)
                 return f"```json\n{code_block}\n```\n\nAction result:\n```json\n{result_str}\n```"
                 
                 # If no action matched, return the original code block
@@ -189,10 +321,85 @@ def parse_args():
         action="store_true",
         help="Disable executing actions"
     )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Try a small model first and escalate to --model on low confidence"
+    )
+    parser.add_argument(
+        "--small-model",
+        default="llama3.2:3b",
+        help="First-tier model for --cascade (default: llama3.2:3b)"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as a long-lived daemon serving agent sessions"
+    )
+    parser.add_argument(
+        "--client",
+        action="store_true",
+        help="Forward queries to a running daemon instead of loading the agent"
+    )
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET,
+        help=f"Unix socket path of the daemon (default: {DEFAULT_SOCKET})"
+    )
+    parser.add_argument(
+        "--tcp",
+        action="store_true",
+        help="Use localhost TCP at --address instead of the Unix socket"
+    )
+    parser.add_argument(
+        "--address",
+        default=f"{DEFAULT_ADDRESS[0]}:{DEFAULT_ADDRESS[1]}",
+        help="host:port of the daemon with --tcp"
+    )
+    parser.add_argument(
+        "--session",
+        default="default",
+        help="Daemon session to use in client mode (default: default)"
+    )
+    parser.add_argument(
+        "--record",
+        default=None,
+        metavar="CASSETTE",
+        help="Record every LLM request and response to a JSONL cassette"
+    )
+    parser.add_argument(
+        "--replay",
+        default=None,
+        metavar="CASSETTE",
+        help="Answer LLM requests from a recorded cassette instead of a live model"
+    )
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Replay speed multiplier; 0 replays as fast as possible (default: 1)"
+    )
     
     return parser.parse_args()
 
 
+def parse_address(address: str) -> tuple:
+    """Split a host:port string into a (host, port) tuple."""
+    host, _, port = address.rpartition(":")
+    return host or DEFAULT_ADDRESS[0], int(port)
+
+
+def configure_cassette(args) -> None:
+    """Attach a record/replay cassette to every handler created from now on."""
+    if args.record and args.replay:
+        raise SystemExit("--record and --replay cannot be used together")
+    path = args.record or args.replay
+    if path:
+        os.environ["LAZYME_CASSETTE"] = path
+        os.environ["LAZYME_CASSETTE_MODE"] = "record" if args.record else "replay"
+        os.environ["LAZYME_CASSETTE_SPEED"] = str(args.replay_speed)
+
+
 def setup_agent(args) -> ActionEnabledAgent:
     """Set up the Ollama agent with the provided configuration."""
     system_prompt = args.system_prompt
@@ -210,12 +417,17 @@ def setup_agent(args) -> ActionEnabledAgent:
     
     if args.disable_actions:
         agent.set_enable_actions(False)
+    
+    if args.cascade:
+        agent.enable_cascade(small_model=args.small_model)
         
     return agent
 
 
 def list_available_models():
     """List all available models in the Ollama instance."""
+    from llm_handler.ask_ollama import OllamaHandler
+
     handler = OllamaHandler()
     models = handler.list_models()
     
@@ -236,9 +448,13 @@ def list_available_models():
 
 def interactive_mode(agent: ActionEnabledAgent):
     """Run the agent in interactive mode."""
+    # A user is waiting on every reply, so jump ahead of queued batch work
+    agent.ollama.priority = Priority.INTERACTIVE
     print(f"Local LLM Agent (using {agent.ollama.model})")
     print("Type 'exit', 'quit', or Ctrl+C to exit")
     print("Type 'reset' to reset the conversation")
+    if agent.router:
+        print("Type 'stats' to show cascade tier statistics")
     actions_status = "enabled" if agent.enable_actions else "disabled"
     print(f"System actions are {actions_status}")
     print("-----------------------------------------")
@@ -255,6 +471,10 @@ def interactive_mode(agent: ActionEnabledAgent):
                 print("Conversation reset.")
                 continue
             
+            if user_input.lower() == "stats" and agent.router:
+                print(json.dumps(agent.router.stats(), indent=2))
+                continue
+            
             if not user_input.strip():
                 continue
                 
@@ -268,12 +488,83 @@ def interactive_mode(agent: ActionEnabledAgent):
         print("\nExiting...")
 
 
+def serve(args):
+    """Run the agent daemon, creating one agent per session on demand."""
+    def agent_factory(session_id: str) -> ActionEnabledAgent:
+        agent = setup_agent(args)
+        agent.ollama.session = f"daemon-{session_id}"
+        return agent
+
+    socket_path = None if args.tcp else args.socket
+    server = AgentServer(
+        agent_factory=agent_factory,
+        socket_path=socket_path,
+        address=parse_address(args.address),
+    )
+    location = socket_path or args.address
+    print(f"Agent daemon (using {args.model}) listening on {location}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nExiting...")
+
+
+def client_mode(args):
+    """Forward queries to a running daemon."""
+    client = AgentClient(socket_path=None if args.tcp else args.socket, address=parse_address(args.address))
+
+    def ask(message: str) -> None:
+        result = client.query(message, session=args.session)
+        if "error" in result:
+            print(f"Error: {result['error']}")
+        else:
+            print(result["response"])
+
+    if args.single_query:
+        ask(args.single_query)
+        return
+
+    print(f"Local LLM Agent client (session {args.session})")
+    print("Type 'exit', 'quit', or Ctrl+C to exit")
+    print("Type 'reset' to reset the conversation")
+    print("-----------------------------------------")
+    try:
+        while True:
+            user_input = input("\n> ")
+
+            if user_input.lower() in ("exit", "quit"):
+                break
+
+            if user_input.lower() == "reset":
+                client.reset(args.session)
+                print("Conversation reset.")
+                continue
+
+            if not user_input.strip():
+                continue
+
+            ask(user_input)
+
+    except KeyboardInterrupt:
+        print("\nExiting...")
+
+
 def main():
     args = parse_args()
     
+    if args.client:
+        client_mode(args)
+        return
+    
+    configure_cassette(args)
+    
     if args.list_models:
         list_available_models()
         return
+    
+    if args.serve:
+        serve(args)
+        return
         
     # Set up the agent
     try:
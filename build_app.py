@@ -1,18 +1,63 @@
+import json
+
+from actions.fix_cache import FixCache
 from flows.define_app import DefineAppFlow
 from flows.define_app_arch import DefineAppArchFlow
 from flows.define_deployment_steps import DefineAppDeployFlow
 from flows.define_steps import DefineAppDevStepsFlow
 from flows.define_test_steps import DefineAppDevTestStepsFlow
+from flows.steps import StepExecutor, json_lists
 from llm_handler.ask_gpt import GPTHandler
 from llm_handler.ask_ollama import OllamaHandler
+from llm_handler.scheduler import Priority
+
+
+FIX_SYSTEM_MESSAGE = """You repair failed shell commands.
+Respond ONLY with a JSON list of shell commands that fix the cause of the failure,
+without re-running the failed command itself."""
 
 
 class BUILDer:
-    def __init__(self):
+    def __init__(self, max_workers: int = 4):
         self.__api = GPTHandler()
+        self.llm_handler = None
+        # Failed steps try known fixes before asking the LLM for new ones
+        self.step_executor = StepExecutor(max_workers=max_workers, fix_cache=FixCache(), ask_fix=self._ask_fix)
+
+    def _ask_fix(self, failure) -> list:
+        if self.llm_handler is None:
+            return []
+        details = {key: failure.get(key) for key in ("command", "exit_code", "stderr", "error")}
+        response = self.llm_handler.chat(messages=[
+            {"role": "system", "content": FIX_SYSTEM_MESSAGE},
+            {"role": "user", "content": json.dumps(details)},
+        ])
+        content = response.get("message", {}).get("content", "")
+        for commands in json_lists(content):
+            if commands and all(isinstance(command, str) for command in commands):
+                return commands
+        return []
+
+    def _run_steps(self, steps) -> bool:
+        if not steps:
+            # An empty plan means the reply could not be parsed, not that there is nothing to do
+            print("No steps could be parsed from the plan")
+            return False
+        report = self.step_executor.run(steps)
+        if "error" in report:
+            print(f"Invalid step plan: {report['error']}")
+            return False
+        for step_id, entry in report["steps"].items():
+            fix = entry.get("result", {}).get("fix")
+            note = f" (fix from {fix['source']}: {'applied' if fix['success'] else 'failed'})" if fix else ""
+            print(f"[{entry['status']}] {step_id}{note}")
+        critical_path = report["critical_path"]
+        print(f"Critical path ({critical_path['duration']}s of {report['wall_time']}s): "
+              f"{' -> '.join(critical_path['steps'])}")
+        return report["success"]
 
     def build(self, input: str):
-        llm_handler = OllamaHandler()
+        llm_handler = self.llm_handler = OllamaHandler(priority=Priority.BATCH, session="build")
         define_app_flow = DefineAppFlow(llm_handler)
         define_app_arch_flow = DefineAppArchFlow(llm_handler)
         define_app_deploy_flow = DefineAppDeployFlow(llm_handler)
@@ -20,13 +65,13 @@ class BUILDer:
         define_app_dev_test_steps_flow = DefineAppDevTestStepsFlow(llm_handler)
         clarified_instructions = define_app_flow.execute(input)
         app_arch = define_app_arch_flow.execute(clarified_instructions)
-        app_dev_steps = define_app_deploy_flow.execute(app_arch, clarified_instructions)
-        for step in app_dev_steps:
-            step.execute()
+        app_dev_steps = define_app_dev_steps_flow.execute(app_arch)
+        if not self._run_steps(app_dev_steps):
+            return
 
-        app_dev_test_steps = define_app_dev_test_steps_flow.execute()
-        for step in app_dev_test_steps:
-            step.execute()
+        app_dev_test_steps = define_app_dev_test_steps_flow.execute(app_arch)
+        if not self._run_steps(app_dev_test_steps):
+            return
 
         define_app_deploy_flow.execute(app_arch)
 
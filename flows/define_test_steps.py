@@ -1,5 +1,30 @@
+from typing import List
+
 from flows.base_flow import BaseFlow
+from flows.steps import Step, parse_steps_from_chat
+
+SYSTEM_MESSAGE = """You are a helpful AI assistant who turns an application architecture into test steps.
+Respond ONLY with a JSON list. Each item must have:
+- "id": a short unique identifier
+- "command": the shell command that runs the test step
+- "description": one sentence describing the step
+- "depends_on": ids of steps that must finish before this one (empty if independent)
+- "resources": names of shared resources the step locks, e.g. "database", "port:8000"
+Keep steps independent whenever possible so they can run in parallel.
+
+IMPORTANT: once complete, ONLY output 'FINISH'."""
 
 
 class DefineAppDevTestStepsFlow(BaseFlow):
-    pass
\ No newline at end of file
+
+    def execute(self, input: str) -> List[Step]:
+        """
+        Execute the flow to define the test steps.
+        Returns the steps with their dependencies and resource locks.
+        """
+        print(f"Defining test steps with input: {input}")
+        response = self.llm_handler.handle_message(
+            message=f"Define the test steps for this application architecture: {input}",
+            system_message=SYSTEM_MESSAGE
+        )
+        return parse_steps_from_chat(response)
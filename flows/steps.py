@@ -0,0 +1,280 @@
+"""
+Plan Steps
+This module defines generated development/test steps and a worker-pool
+executor that runs independent steps concurrently.
+"""
+
+import json
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, Iterator, List, Optional, Set
+from attrs import define, field
+
+
+# Rounding tolerance when deciding whether a step finished before another started
+CLOCK_SLACK = 0.01
+
+
+@define
+class Step:
+    """A single generated plan step with its dependencies and resource locks."""
+    id: str
+    command: str
+    description: str = ""
+    depends_on: List[str] = field(factory=list)
+    resources: List[str] = field(factory=list)
+    timeout: float = 600.0
+
+    def execute(self) -> Dict[str, Any]:
+        """Run the step's shell command."""
+        try:
+            result = subprocess.run(
+                self.command,
+                shell=True,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+            return {
+                "success": result.returncode == 0,
+                "exit_code": result.returncode,
+                "stdout": result.stdout,
+                "stderr": result.stderr
+            }
+        except subprocess.TimeoutExpired:
+            return {"success": False, "error": "Step execution timed out"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+
+def _as_list(value: Any) -> List[str]:
+    """Normalize a field that should be a list of names; a bare string is one name."""
+    if value is None:
+        return []
+    if isinstance(value, (str, int, float)):
+        return [str(value)]
+    return [str(item) for item in value]
+
+
+def json_lists(text: str) -> Iterator[List[Any]]:
+    """Yield every JSON list embedded in ``text``, in order of appearance."""
+    decoder = json.JSONDecoder()
+    position = text.find("[")
+    while position != -1:
+        try:
+            value, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position = text.find("[", position + 1)
+            continue
+        if isinstance(value, list):
+            yield value
+        position = text.find("[", end)
+
+
+def parse_steps(text: str) -> List[Step]:
+    """Parse a JSON list of steps out of an LLM reply.
+
+    Each item needs ``id`` and ``command``; ``depends_on``, ``resources`` and
+    ``description`` are optional. Items without an id are numbered in order.
+    The first list in the reply that holds any steps is used, so brackets in
+    surrounding prose do not matter.
+    """
+    for items in json_lists(text):
+        steps = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get("command"):
+                continue
+            steps.append(Step(
+                id=str(item.get("id", f"step_{index + 1}")),
+                command=item["command"],
+                description=item.get("description", ""),
+                depends_on=_as_list(item.get("depends_on")),
+                resources=_as_list(item.get("resources")),
+            ))
+        if steps:
+            return steps
+    return []
+
+
+def parse_steps_from_chat(response: Any) -> List[Step]:
+    """Parse the step plan from a chat result, newest message first.
+
+    The summary is only the last message, which is usually the bare
+    termination sentinel, so the chat history is searched for the plan.
+    """
+    history = getattr(response, "chat_history", None) or []
+    candidates = [message.get("content") or "" for message in reversed(history) if isinstance(message, dict)]
+    candidates.append(str(getattr(response, "summary", response)))
+    for text in candidates:
+        steps = parse_steps(text)
+        if steps:
+            return steps
+    return []
+
+
+@define
+class StepExecutor:
+    """Runs steps on a worker pool as soon as their dependencies succeed.
+
+    Steps sharing a resource name never run at the same time. A failed step
+    is first handed to ``fix_cache``, if set: known fixes are tried, then
+    fixes from ``ask_fix``, and the step is retried after each. When it still
+    fails, every step that depends on it (directly or not) is cancelled.
+    """
+    max_workers: int = 4
+    fix_cache: Any = None  # actions.fix_cache.FixCache
+    ask_fix: Optional[Callable[[Dict[str, Any]], List[str]]] = None  # Failure -> fix commands
+
+    def _heal(self, step: Step, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Try to repair a failed step through the fix cache, returning the final result."""
+        retried: Dict[str, Any] = {}
+
+        def apply_fix(commands: List[str]) -> bool:
+            for command in commands:
+                if not Step(id=f"{step.id}_fix", command=command, timeout=step.timeout).execute().get("success"):
+                    return False
+            retried.clear()
+            retried.update(step.execute())
+            return bool(retried.get("success"))
+
+        failure = dict(result, command=step.command)
+        resolution = self.fix_cache.resolve(failure, apply_fix, self.ask_fix or (lambda failure: []))
+        final = dict(retried) if resolution["success"] else dict(result)
+        final["fix"] = resolution
+        return final
+
+    @staticmethod
+    def _validate(steps: Dict[str, Step]) -> Optional[str]:
+        for step in steps.values():
+            for dep in step.depends_on:
+                if dep not in steps:
+                    return f"Step '{step.id}' depends on unknown step '{dep}'"
+
+        # Kahn's algorithm to reject cycles up front
+        indegree = {step_id: len(step.depends_on) for step_id, step in steps.items()}
+        dependents = {step_id: [] for step_id in steps}
+        for step in steps.values():
+            for dep in step.depends_on:
+                dependents[dep].append(step.id)
+        queue = [step_id for step_id, count in indegree.items() if count == 0]
+        visited = 0
+        while queue:
+            step_id = queue.pop()
+            visited += 1
+            for dependent in dependents[step_id]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    queue.append(dependent)
+        if visited != len(steps):
+            return "Step dependencies contain a cycle"
+        return None
+
+    @staticmethod
+    def _critical_path(steps: Dict[str, Step], report: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Walk back from the last step to finish through whatever held each step up.
+
+        A step waits on its dependencies and on earlier steps that held one of
+        its resource locks, so lock waits are part of the path and its duration.
+        """
+        ran = [step_id for step_id in steps if report[step_id]["status"] in ("succeeded", "failed")]
+        if not ran:
+            return {"steps": [], "duration": 0.0}
+        finish = {step_id: report[step_id]["started"] + report[step_id]["duration"] for step_id in ran}
+
+        def blocker(step_id: str) -> Optional[str]:
+            step = steps[step_id]
+            started = report[step_id]["started"]
+            candidates = [dep for dep in step.depends_on if dep in finish]
+            candidates += [
+                other for other in ran
+                if other != step_id and set(steps[other].resources) & set(step.resources)
+                and finish[other] <= started + CLOCK_SLACK
+            ]
+            return max(candidates, key=lambda candidate: finish[candidate], default=None)
+
+        end = max(ran, key=lambda step_id: finish[step_id])
+        path = []
+        cursor: Optional[str] = end
+        while cursor is not None and cursor not in path:
+            path.append(cursor)
+            cursor = blocker(cursor)
+        return {"steps": list(reversed(path)), "duration": round(finish[end], 3)}
+
+    def run(self, steps: List[Step]) -> Dict[str, Any]:
+        """Run all steps and report per-step status and the critical path."""
+        by_id = {step.id: step for step in steps}
+        if len(by_id) != len(steps):
+            return {"success": False, "error": "Step ids must be unique"}
+        error = self._validate(by_id)
+        if error:
+            return {"success": False, "error": error}
+
+        report: Dict[str, Dict[str, Any]] = {step_id: {"status": "pending"} for step_id in by_id}
+        pending: Set[str] = set(by_id)
+        held: Set[str] = set()
+        running: Dict[Future, str] = {}
+        workers = max(1, self.max_workers)
+        started = time.monotonic()
+
+        def timed_execute(step: Step) -> Dict[str, Any]:
+            step_started = time.monotonic()
+            try:
+                result = step.execute()
+                if not result.get("success") and self.fix_cache is not None:
+                    result = self._heal(step, result)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            return {"result": result, "started": step_started - started, "duration": time.monotonic() - step_started}
+
+        def cancel_dependents(failed_id: str) -> None:
+            stack = [failed_id]
+            while stack:
+                current = stack.pop()
+                for step_id in list(pending):
+                    if current in by_id[step_id].depends_on:
+                        pending.discard(step_id)
+                        report[step_id] = {"status": "cancelled", "reason": f"Dependency '{failed_id}' failed"}
+                        stack.append(step_id)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                # Submit ready steps in plan order, respecting resource locks
+                for step in steps:
+                    if len(running) >= workers:
+                        break
+                    if step.id not in pending:
+                        continue
+                    if any(report[dep]["status"] != "succeeded" for dep in step.depends_on):
+                        continue
+                    if held.intersection(step.resources):
+                        continue
+                    pending.discard(step.id)
+                    held.update(step.resources)
+                    report[step.id] = {"status": "running"}
+                    running[pool.submit(timed_execute, step)] = step.id
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = running.pop(future)
+                    held.difference_update(by_id[step_id].resources)
+                    outcome = future.result()
+                    succeeded = bool(outcome["result"].get("success"))
+                    report[step_id] = {
+                        "status": "succeeded" if succeeded else "failed",
+                        "started": round(outcome["started"], 3),
+                        "duration": round(outcome["duration"], 3),
+                        "result": outcome["result"],
+                    }
+                    if not succeeded:
+                        cancel_dependents(step_id)
+
+        return {
+            "success": all(entry["status"] == "succeeded" for entry in report.values()),
+            "steps": report,
+            "critical_path": self._critical_path(by_id, report),
+            "wall_time": round(time.monotonic() - started, 3),
+        }
@@ -1,4 +1,4 @@
-import requests
+from llm_handler.http_transport import default_transport
 
 # Your API key
 api_key = "YOUR_API_KEY"
@@ -10,7 +10,7 @@ base_url = "https://api.example.com"
 def get_data(endpoint):
     url = base_url + endpoint
     headers = {"Authorization": f"Bearer {api_key}"}
-    response = requests.get(url, headers=headers)
+    response = default_transport.request("GET", url, headers=headers)
     if response.status_code == 200:
         return response.json()
     else:
@@ -20,7 +20,7 @@ def get_data(endpoint):
 def post_data(endpoint, data):
     url = base_url + endpoint
     headers = {"Authorization": f"Bearer {api_key}"}
-    response = requests.post(url, headers=headers, json=data)
+    response = default_transport.request("POST", url, headers=headers, json=data)
     if response.status_code == 200 or response.status_code == 201:
         return response.json()
     else:
@@ -50,7 +50,7 @@ def call_gemini(url):
     gemini_headers = {'Content-Type': 'application/json',
                        'Accept': 'application/json',
                        'X-gemini-api-key': 'YOUR_API_KEY_HERE'}
-    response = requests.get(url, headers=gemini_headers, timeout=60)
+    response = default_transport.request("GET", url, headers=gemini_headers, timeout=60)
     response.raise_for_status()
     return response.content
 
@@ -61,5 +61,5 @@ if __name__ == "__main__":
     gemini_request_payload = {'addresses': request_data}
     gemini_request = {'method': 'GET', 'url': gemini_url,
                        'data': json.dumps(gemini_request_payload)}
-    response = requests.request(**gemini_request)
+    response = default_transport.request(**gemini_request)
     response.raise_for_status()
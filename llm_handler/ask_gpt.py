@@ -1,8 +1,14 @@
+import json
 import os
 
-from attrs import define
+from attrs import define, field
 from openai import OpenAI
 
+from llm_handler.cassette import Cassette, cassette_from_env
+from llm_handler.http_transport import default_transport
+from llm_handler.scheduler import Priority, default_scheduler
+from llm_handler.single_flight import default_flights, request_key
+
 
 @define
 class GPTHandler:
@@ -10,21 +16,103 @@ class GPTHandler:
     setting: str = ("You are a helpful senior software developer oriented on "
                     "high speed efficient errorless python code. Your responses are "
                     "in json format.")
+    model: str = "o1"
+    coalesce: bool = True  # Share one request between identical concurrent ask_gpt() calls
+    priority: Priority = Priority.DEFAULT
+    session: str = "default"
+    cassette: Cassette | None = field(factory=cassette_from_env)  # Records or replays every request
+    _client: OpenAI | None = field(default=None, init=False)
 
     @property
     def api_key(self) -> str:
         return self._api_key or os.environ['GPT_API_KEY']
 
+    @property
+    def client(self) -> OpenAI:
+        # One client per handler, on the shared connection pool
+        if self._client is None:
+            self._client = OpenAI(
+                api_key=self.api_key,
+                http_client=default_transport.httpx_client(),
+                max_retries=default_transport.retries,
+            )
+        return self._client
+
     def ask_gpt(self, prompt, setting):
-        client = OpenAI(api_key=self.api_key)
-
-        response = client.chat.completions.create(
-            model="o1",
-            #response_format={"type": "json_object"},
-            messages=[
-                {"role": "system",
-                 "content": setting or self.setting},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        if not self.coalesce:
+            return self._ask_gpt(prompt, setting)
+        key = request_key("openai", self.model, setting or self.setting, prompt)
+        return default_flights.run(key, lambda emit, cancelled: self._ask_gpt(prompt, setting))
+
+    def _ask_gpt(self, prompt, setting):
+        if self.cassette is not None:
+            request = {"model": self.model, "messages": [setting or self.setting, prompt]}
+            try:
+                return self.cassette.call("openai_ask", request, lambda: self._complete(prompt, setting))
+            except LookupError as e:
+                # Same error payload as chat(), as the JSON text ask_gpt replies are expected in
+                return json.dumps({"error": str(e)})
+        return self._complete(prompt, setting)
+
+    def _complete(self, prompt, setting):
+        with default_scheduler.slot("openai", self.priority, self.session):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                #response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system",
+                     "content": setting or self.setting},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         return response.choices[0].message.content
+
+    @staticmethod
+    def _to_openai_message(message: dict) -> dict:
+        """Convert a chat message in the Ollama shape to the OpenAI shape."""
+        message = {key: value for key, value in message.items() if key != "tool_name"}
+        if not message.get("tool_calls"):
+            return message
+        tool_calls = []
+        for index, call in enumerate(message["tool_calls"]):
+            arguments = call["function"].get("arguments", {})
+            tool_calls.append({
+                "id": call.get("id", f"call_{index}"),
+                "type": "function",
+                "function": {
+                    "name": call["function"]["name"],
+                    "arguments": arguments if isinstance(arguments, str) else json.dumps(arguments),
+                },
+            })
+        return dict(message, tool_calls=tool_calls)
+
+    def chat(self, messages: list[dict], tools: list[dict] | None = None) -> dict:
+        """Chat completion with optional native tool calling, in OllamaHandler.chat's shape."""
+        if self.cassette is not None:
+            request = {"model": self.model, "messages": messages, "tools": tools}
+            try:
+                return self.cassette.call("openai_chat", request, lambda: self._chat(messages, tools))
+            except LookupError as e:
+                return {"error": str(e)}
+        return self._chat(messages, tools)
+
+    def _chat(self, messages: list[dict], tools: list[dict] | None) -> dict:
+        kwargs = {"tools": tools} if tools else {}
+        try:
+            with default_scheduler.slot("openai", self.priority, self.session):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[self._to_openai_message(m) for m in messages],
+                    **kwargs
+                )
+        except Exception as e:
+            return {"error": str(e)}
+
+        choice = response.choices[0].message
+        message = {"role": "assistant", "content": choice.content or ""}
+        if choice.tool_calls:
+            message["tool_calls"] = [
+                {"id": call.id, "function": {"name": call.function.name, "arguments": call.function.arguments}}
+                for call in choice.tool_calls
+            ]
+        return {"model": self.model, "message": message}
@@ -1,8 +1,19 @@
 # -*- coding: utf-8 -*-
+import logging
+
 import autogen
 from llm_handler.base_handler import BaseHandler
-import autogen
-from attrs import define
+from llm_handler.cassette import Cassette, cassette_from_env
+from llm_handler.http_transport import default_transport
+from llm_handler.kernel_executor import KERNEL_SUPPORTED, KernelCodeExecutor
+from llm_handler.ollama_client import ChatUsage, ContextTuner, StreamingOllamaClient, default_tuner, stream_chat
+from llm_handler.scheduler import Priority, QueueFullError, default_scheduler
+from llm_handler.single_flight import default_flights, request_key
+import requests
+from attrs import define, field
+
+
+logger = logging.getLogger(__name__)
 
 
 SYSTEM_MESSAGE = """You are a helpful AI assistant who writes code and the user
@@ -23,25 +34,137 @@ SYSTEM_MESSAGE = """You are a helpful AI assistant who writes code and the user
 
 @define
 class OllamaHandler(BaseHandler):
+    model: str = "devstral:latest"
     workdir: str = "coding"  # Optional: Specify a working directory for code execution
+    use_kernel: bool = KERNEL_SUPPORTED  # Keep one warm Python kernel per handler instead of a process per script
+    cell_timeout: float = 60.0
+    memory_limit_mb: int | None = 2048
+    max_turns: int | None = 10  # Upper bound on LLM replies per call
+    max_tokens: int | None = None  # Upper bound on prompt + completion tokens per call
+    termination_sentinel: str = "FINISH"
+    max_output: int | None = None  # num_predict cap per request; None leaves the reply length uncapped
+    tuner: ContextTuner = field(factory=lambda: default_tuner)  # Shared so num_ctx buckets stay sticky per model
+    coalesce: bool = True  # Share one inference between identical concurrent chat() calls
+    priority: Priority = Priority.DEFAULT  # Scheduling class for this handler's requests
+    session: str = "default"  # Sessions share the backend fairly within a priority class
+    cassette: Cassette | None = field(factory=cassette_from_env)  # Records or replays every request
+    last_usage: dict = field(factory=dict, init=False)  # Turns and tokens spent by the last call
+    _code_executor: KernelCodeExecutor | None = field(default=None, init=False)
     config_list = [
         {
             # Let's choose the Meta's Llama 3.1 model (model names must match Ollama exactly)
             "model": "devstral:latest",
-            # We specify the API Type as 'ollama' so it uses the Ollama client class
-            "api_type": "ollama",
-            "stream": False,
+            # Streams from Ollama so generation stops as soon as the termination sentinel shows up
+            "model_client_cls": "StreamingOllamaClient",
             "client_host": "http://localhost:11434",
             # "use_docker": False,  # Use Docker for Ollama
         }
     ]
 
+    @property
+    def host(self) -> str:
+        return self.config_list[0]["client_host"]
+
+    @property
+    def llm_config(self) -> dict:
+        return {"config_list": [dict(entry, model=self.model) for entry in self.config_list]}
+
+    def _is_termination_msg(self, message: dict) -> bool:
+        return self.termination_sentinel in (message.get("content") or "").rstrip()
+
+    def _new_usage(self) -> ChatUsage:
+        return ChatUsage(max_turns=self.max_turns, max_tokens=self.max_tokens)
+
+    def _register_clients(self, usage: ChatUsage, *agents) -> None:
+        for agent in agents:
+            agent.register_model_client(
+                model_client_cls=StreamingOllamaClient,
+                usage=usage,
+                sentinel=self.termination_sentinel,
+                priority=self.priority,
+                session=self.session,
+                max_output=self.max_output,
+                tuner=self.tuner,
+                cassette=self.cassette,
+            )
+
+    def _finish(self, usage: ChatUsage) -> None:
+        self.last_usage = usage.to_dict()
+        logger.info("Ollama usage: %s", self.last_usage)
+
+    def _record_usage(self, response: dict) -> dict:
+        usage = self._new_usage()
+        if "error" not in response:
+            usage.add(response["usage"])
+        self.last_usage = usage.to_dict()
+        return response
+
+    def _chat(self, messages: list[dict], model: str, on_token=None, cancel_event=None,
+              max_output: int | None = None, tools: list[dict] | None = None) -> dict:
+        options = self.tuner.options_for(model, messages, max_output or self.max_output)
+        chat = self.cassette.stream_chat if self.cassette is not None else stream_chat
+        try:
+            with default_scheduler.slot("ollama", self.priority, self.session):
+                response = chat(
+                    model=model,
+                    messages=messages,
+                    host=self.host,
+                    options=options,
+                    sentinel=None,  # Plain chat has no termination protocol
+                    max_tokens=self.max_tokens,
+                    on_token=on_token,
+                    cancel_event=cancel_event,
+                    tools=tools,
+                )
+        except (QueueFullError, TimeoutError) as e:
+            return {"error": str(e)}
+        return response
+
+    def chat(self, messages: list[dict], model: str | None = None,
+             on_token=None, timeout: float | None = None, max_output: int | None = None,
+             tools: list[dict] | None = None) -> dict:
+        """Run a single streamed chat completion within the token budget.
+
+        Identical concurrent requests share one inference; ``on_token``
+        receives every streamed chunk and ``timeout`` limits how long this
+        caller waits before dropping out. ``max_output`` caps the reply length
+        for this call site; the context window is sized from the prompt.
+        ``tools`` are native tool-calling schemas, see ActionRegistry.tool_schemas.
+        """
+        model = model or self.model
+        if not self.coalesce:
+            return self._record_usage(self._chat(messages, model, on_token, max_output=max_output, tools=tools))
+
+        key = request_key("ollama", self.host, model, messages, self.max_tokens, max_output or self.max_output, tools)
+        try:
+            response = default_flights.run(
+                key,
+                lambda emit, cancelled: self._chat(messages, model, emit, cancelled, max_output, tools),
+                on_token=on_token,
+                timeout=timeout,
+            )
+        except TimeoutError as e:
+            response = {"error": str(e)}
+        # Set here rather than in _chat, which only runs on the leader of a coalesced request
+        return self._record_usage(response)
+
+    def list_models(self) -> list[dict]:
+        """List models available on the Ollama server."""
+        try:
+            response = default_transport.request("GET", f"{self.host}/api/tags", timeout=10)
+            response.raise_for_status()
+        except requests.RequestException:
+            return []
+        return response.json().get("models", [])
+
     def handle_message(self, message: str, system_message: str | None = SYSTEM_MESSAGE) -> object:
+        usage = self._new_usage()
         assistant = autogen.AssistantAgent(
         name="Assistant",
-        llm_config={"config_list": self.config_list},
+        llm_config=self.llm_config,
         system_message=system_message,  # Use the defined system message
         )
+        self._register_clients(usage, assistant)
 
         # user_proxy = autogen.UserProxyAgent(
         #     name="User_proxy",
@@ -58,28 +181,59 @@ class OllamaHandler(BaseHandler):
         # )
         response = assistant.initiate_chat(
             message=message,
-            recipient=autogen.ConversableAgent("Ask Ollama", system_message=system_message),  # Use the defined system message
+            recipient=autogen.ConversableAgent(
+                "Ask Ollama",
+                system_message=system_message,  # Use the defined system message
+                is_termination_msg=self._is_termination_msg,
+            ),
+            max_turns=self.max_turns,
         )
+        self._finish(usage)
         return response
 
+    @property
+    def code_executor(self) -> KernelCodeExecutor:
+        """Return the session kernel executor, creating it on first use."""
+        if self._code_executor is None:
+            self._code_executor = KernelCodeExecutor(
+                work_dir=self.workdir,
+                timeout=self.cell_timeout,
+                memory_limit_mb=self.memory_limit_mb,
+            )
+        return self._code_executor
+
+    def close(self) -> None:
+        """Stop the session kernel, if one was started."""
+        if self._code_executor is not None:
+            self._code_executor.stop()
+
     def handle_code_message(self, message: str, system_message: str | None = SYSTEM_MESSAGE) -> object:
+        usage = self._new_usage()
         assistant = autogen.AssistantAgent(
         name="Assistant",
-        llm_config={"config_list": self.config_list},
+        llm_config=self.llm_config,
         system_message=system_message,  # Use the defined system message
         )
 
+        if self.use_kernel and KERNEL_SUPPORTED:
+            code_execution_config = {"executor": self.code_executor}
+        else:
+            code_execution_config = {"use_docker": False, "work_dir": self.workdir}  # Optional: Specify a working directory
+
         user_proxy = autogen.UserProxyAgent(
             name="User_proxy",
             human_input_mode="NEVER",
-            code_execution_config={"use_docker": False, "work_dir": self.workdir},  # Optional: Specify a working directory
-            llm_config={"config_list": self.config_list},
-            is_termination_msg=lambda x: "FINISH" in x.get("content", "").rstrip(),  # Define termination message
+            code_execution_config=code_execution_config,
+            llm_config=self.llm_config,
+            is_termination_msg=self._is_termination_msg,  # Define termination message
         )
+        self._register_clients(usage, assistant, user_proxy)
 
         # 4. Initiate the chat
         response = user_proxy.initiate_chat(
             assistant,
             message=message,
+            max_turns=self.max_turns,
         )
+        self._finish(usage)
         return response
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Cassette
+This module records LLM requests and responses, including the timing of
+every streamed chunk, to a JSONL cassette and replays them later, so agent
+and build runs can be profiled offline and deterministically.
+
+Set LAZYME_CASSETTE to a cassette path and LAZYME_CASSETTE_MODE to "record"
+or "replay" to attach a cassette to every handler; LAZYME_CASSETTE_SPEED
+scales replay delays (1 replays at recorded speed, 0 as fast as possible).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from attrs import define, field
+
+from llm_handler.ollama_client import stream_chat
+from llm_handler.single_flight import request_key
+
+
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cassette.jsonl")
+MODES = ("record", "replay")
+
+logger = logging.getLogger(__name__)
+
+
+@define
+class Cassette:
+    """Records interactions to ``path`` or replays them from it.
+
+    Replay matches a request by its kind, model, messages and tools; when
+    nothing matches and ``strict`` is off, the next unused interaction of the
+    same kind is replayed instead, so runs whose prompts drift slightly (for
+    example from machine-specific action results) still complete.
+    """
+    path: str = DEFAULT_CASSETTE
+    mode: str = "replay"
+    speed: float = 1.0  # Replay delay multiplier is 1 / speed; 0 replays as fast as possible
+    strict: bool = False
+    _interactions: List[Dict[str, Any]] = field(factory=list, init=False)
+    _used: List[bool] = field(factory=list, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+
+    def __attrs_post_init__(self):
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{self.mode}', expected one of {MODES}")
+        if self.mode == "replay":
+            with open(self.path, "r", encoding="utf-8") as file:
+                self._interactions = [json.loads(line) for line in file if line.strip()]
+            self._used = [False] * len(self._interactions)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    @staticmethod
+    def _key(kind: str, request: Dict[str, Any]) -> str:
+        return request_key(kind, request.get("model"), request.get("messages"), request.get("tools"))
+
+    def _record(self, kind: str, request: Dict[str, Any], response: Any,
+                elapsed: float, chunks: Optional[List[List[Any]]] = None) -> None:
+        entry = {
+            "kind": kind,
+            "key": self._key(kind, request),
+            "request": request,
+            "response": response,
+            "elapsed": round(elapsed, 4),
+        }
+        if chunks is not None:
+            entry["chunks"] = chunks
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+    def _take(self, kind: str, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self._key(kind, request)
+        with self._lock:
+            candidates = [i for i, entry in enumerate(self._interactions)
+                          if not self._used[i] and entry["kind"] == kind]
+            index = next((i for i in candidates if self._interactions[i]["key"] == key), None)
+            if index is None and candidates and not self.strict:
+                index = candidates[0]
+                logger.warning("cassette: no exact match for %s request, replaying the next one in order", kind)
+            if index is None:
+                return None
+            self._used[index] = True
+            return self._interactions[index]
+
+    def _sleep(self, seconds: float) -> None:
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def call(self, kind: str, request: Dict[str, Any], fn: Callable[[], Any]) -> Any:
+        """Record or replay a non-streaming call; ``request`` identifies it."""
+        if self.mode == "replay":
+            entry = self._take(kind, request)
+            if entry is None:
+                raise LookupError(f"No recorded {kind} response in cassette {self.path}")
+            self._sleep(entry["elapsed"])
+            return entry["response"]
+        started = time.monotonic()
+        response = fn()
+        self._record(kind, request, response, time.monotonic() - started)
+        return response
+
+    def stream_chat(self, model: str, messages: List[Dict[str, Any]],
+                    on_token: Optional[Callable[[str], None]] = None,
+                    cancel_event: Optional[threading.Event] = None,
+                    tools: Optional[List[Dict[str, Any]]] = None, **kwargs) -> Dict[str, Any]:
+        """Drop-in for ``ollama_client.stream_chat`` that records or replays chunk by chunk."""
+        request = {"model": model, "messages": messages, "tools": tools, "options": kwargs.get("options")}
+        if self.mode == "replay":
+            entry = self._take("ollama_chat", request)
+            if entry is None:
+                return {"error": f"No recorded response in cassette {self.path}"}
+            replayed = 0.0
+            for delay, token in entry.get("chunks", []):
+                if cancel_event is not None and cancel_event.is_set():
+                    return {"error": "Request cancelled"}
+                self._sleep(delay)
+                replayed += delay
+                if on_token:
+                    on_token(token)
+            self._sleep(entry["elapsed"] - replayed)
+            return entry["response"]
+
+        chunks: List[List[Any]] = []
+        started = last = time.monotonic()
+
+        def capture(token: str) -> None:
+            nonlocal last
+            now = time.monotonic()
+            chunks.append([round(now - last, 4), token])
+            last = now
+            if on_token:
+                on_token(token)
+
+        response = stream_chat(model=model, messages=messages, on_token=capture,
+                               cancel_event=cancel_event, tools=tools, **kwargs)
+        self._record("ollama_chat", request, response, time.monotonic() - started, chunks)
+        return response
+
+    def unused(self) -> int:
+        """Recorded interactions not replayed yet; non-zero after a run hints at drift."""
+        with self._lock:
+            return self._used.count(False)
+
+
+_env_cassette: Optional[Cassette] = None
+_env_lock = threading.Lock()
+
+
+def cassette_from_env() -> Optional[Cassette]:
+    """The process-wide cassette configured through LAZYME_CASSETTE*, if any."""
+    global _env_cassette
+    path = os.environ.get("LAZYME_CASSETTE")
+    if not path:
+        return None
+    with _env_lock:
+        if _env_cassette is None:
+            _env_cassette = Cassette(
+                path=path,
+                mode=os.environ.get("LAZYME_CASSETTE_MODE", "replay"),
+                speed=float(os.environ.get("LAZYME_CASSETTE_SPEED", "1")),
+            )
+        return _env_cassette
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP Transport
+This module gives every LLM backend one shared HTTP layer: keep-alive
+connection pools per host, gzip-compressed responses, a cap on concurrent
+requests per host and retries with jittered exponential backoff on 429 and
+5xx replies.
+"""
+
+import importlib.util
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from attrs import define, field
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _retry_policy(retries: int, backoff_factor: float, backoff_jitter: float) -> Retry:
+    kwargs = dict(
+        total=retries,
+        connect=retries,
+        status=retries,
+        # A read error may come after the server started generating; never resend then
+        read=0,
+        allowed_methods=None,  # LLM APIs are POST; 429/5xx replies mean nothing was generated
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=backoff_factor,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # Hand the last error reply to the caller instead of raising
+    )
+    try:
+        return Retry(backoff_jitter=backoff_jitter, **kwargs)
+    except TypeError:  # urllib3 < 2 has no jitter option
+        return Retry(**kwargs)
+
+
+@define
+class HTTPTransport:
+    """Shared, pooled HTTP client for the Ollama, OpenAI and Gemini handlers.
+
+    Plain requests go through one ``requests.Session``; SDKs that bring their
+    own HTTP stack (OpenAI) get a shared ``httpx.Client`` with the same pool
+    limits, speaking HTTP/2 when the ``h2`` package is installed.
+    """
+    max_per_host: int = 8  # Concurrent requests and kept-alive connections per host
+    max_hosts: int = 10  # Hosts with a connection pool kept open
+    retries: int = 3
+    backoff_factor: float = 0.5
+    backoff_jitter: float = 0.5  # Random seconds added to each backoff
+    http2: bool = True
+    _session: Optional[requests.Session] = field(default=None, init=False)
+    _httpx_client: Any = field(default=None, init=False)
+    _limits: Dict[str, threading.BoundedSemaphore] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+
+    @property
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self.max_hosts,
+                    pool_maxsize=self.max_per_host,
+                    pool_block=True,
+                    max_retries=_retry_policy(self.retries, self.backoff_factor, self.backoff_jitter),
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["Accept-Encoding"] = "gzip, deflate"
+                self._session = session
+            return self._session
+
+    def _limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._lock:
+            limit = self._limits.get(host)
+            if limit is None:
+                limit = self._limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return limit
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request and read the whole response."""
+        with self._limit(url):
+            return self.session.request(method, url, **kwargs)
+
+    @contextmanager
+    def stream(self, method: str, url: str, **kwargs) -> Iterator[requests.Response]:
+        """Send a request and stream the response; the host slot is held until the block exits."""
+        with self._limit(url):
+            response = self.session.request(method, url, stream=True, **kwargs)
+            try:
+                yield response
+            finally:
+                # Closing mid-stream drops the connection, which aborts server-side generation
+                response.close()
+
+    def httpx_client(self) -> Any:
+        """Shared ``httpx.Client`` for SDKs that accept one, e.g. ``OpenAI(http_client=...)``."""
+        # Imported lazily: httpx ships with the openai package, which is optional
+        import httpx
+
+        with self._lock:
+            if self._httpx_client is None:
+                http2 = self.http2 and importlib.util.find_spec("h2") is not None
+                self._httpx_client = httpx.Client(
+                    http2=http2,
+                    limits=httpx.Limits(
+                        max_connections=self.max_per_host * self.max_hosts,
+                        max_keepalive_connections=self.max_per_host,
+                    ),
+                )
+            return self._httpx_client
+
+    def close(self) -> None:
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._httpx_client is not None:
+                self._httpx_client.close()
+                self._httpx_client = None
+
+
+# Shared by all handlers so connections are reused across requests and sessions
+default_transport = HTTPTransport()
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Kernel Code Executor
+This module provides an autogen code executor backed by a long-lived local
+Python process, so imports and state stay warm between fix iterations.
+"""
+
+import json
+import os
+import select
+import subprocess
+import sys
+from typing import IO, List, Optional
+
+from attrs import define, field
+from autogen.coding import CodeBlock, CodeExtractor, CodeResult, MarkdownCodeExtractor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# The kernel talks over inherited pipe fds and select(), which need POSIX
+KERNEL_SUPPORTED = os.name == "posix"
+
+
+# Runs inside the kernel process. Requests and responses travel over
+# dedicated pipes so user code can freely use stdin/stdout/stderr; fd 1 and 2
+# are redirected to a temp file per cell to capture output of child processes too.
+KERNEL_SOURCE = r'''
+import json, os, sys, tempfile, traceback
+request_fd, response_fd = int(sys.argv[1]), int(sys.argv[2])
+requests = os.fdopen(request_fd, "r")
+responses = os.fdopen(response_fd, "w")
+namespace = {"__name__": "__main__"}
+for line in requests:
+    code = json.loads(line)["code"]
+    capture = tempfile.TemporaryFile(mode="w+b")
+    sys.stdout.flush(); sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    os.dup2(capture.fileno(), 1); os.dup2(capture.fileno(), 2)
+    exit_code = 0
+    try:
+        exec(compile(code, "<cell>", "exec"), namespace)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        error_type, error, tb = sys.exc_info()
+        traceback.print_exception(error_type, error, tb.tb_next)
+        exit_code = 1
+    finally:
+        sys.stdout.flush(); sys.stderr.flush()
+        os.dup2(saved[0], 1); os.dup2(saved[1], 2)
+        os.close(saved[0]); os.close(saved[1])
+    capture.seek(0)
+    output = capture.read().decode("utf-8", errors="replace")
+    capture.close()
+    responses.write(json.dumps({"exit_code": exit_code, "output": output}) + "\n")
+    responses.flush()
+'''
+
+PYTHON_LANGUAGES = {"python", "py", "python3", ""}
+SHELL_LANGUAGES = {"sh", "bash", "shell", "console"}
+
+
+@define
+class KernelCodeExecutor:
+    """Executes code blocks in a persistent, restartable Python kernel.
+
+    Python blocks share one interpreter per executor, each cell is limited to
+    ``timeout`` seconds and the kernel to ``memory_limit_mb`` of address space.
+    A cell that times out or crashes the kernel restarts it with a clean state.
+    """
+    work_dir: str = "coding"
+    timeout: float = 60.0
+    memory_limit_mb: Optional[int] = 2048
+    python_executable: str = sys.executable
+    _process: Optional[subprocess.Popen] = field(default=None, init=False)
+    _requests: Optional[IO[str]] = field(default=None, init=False)
+    _responses: Optional[IO[str]] = field(default=None, init=False)
+
+    @property
+    def code_extractor(self) -> CodeExtractor:
+        return MarkdownCodeExtractor()
+
+    def _limit_resources(self) -> None:
+        if resource is not None and self.memory_limit_mb:
+            limit = self.memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def start(self) -> None:
+        """Start the kernel process if it is not already running."""
+        if self._process is not None and self._process.poll() is None:
+            return
+        if not KERNEL_SUPPORTED:
+            raise RuntimeError("The persistent kernel is only supported on POSIX systems")
+        os.makedirs(self.work_dir, exist_ok=True)
+        request_read, request_write = os.pipe()
+        response_read, response_write = os.pipe()
+        self._process = subprocess.Popen(
+            [self.python_executable, "-u", "-c", KERNEL_SOURCE, str(request_read), str(response_write)],
+            cwd=self.work_dir,
+            stdin=subprocess.DEVNULL,
+            pass_fds=(request_read, response_write),
+            preexec_fn=self._limit_resources if resource is not None else None,
+        )
+        os.close(request_read)
+        os.close(response_write)
+        self._requests = os.fdopen(request_write, "w")
+        self._responses = os.fdopen(response_read, "r")
+
+    def stop(self) -> None:
+        """Stop the kernel process and release its pipes."""
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.kill()
+            self._process.wait()
+        for stream in (self._requests, self._responses):
+            if stream is not None:
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+        self._process = self._requests = self._responses = None
+
+    def restart(self) -> None:
+        """Restart the kernel, discarding all interpreter state."""
+        self.stop()
+        self.start()
+
+    def _run_python(self, code: str) -> CodeResult:
+        self.start()
+        try:
+            self._requests.write(json.dumps({"code": code}) + "\n")
+            self._requests.flush()
+        except (BrokenPipeError, OSError):
+            self.stop()
+            return CodeResult(exit_code=1, output="Kernel is not running")
+
+        ready, _, _ = select.select([self._responses], [], [], self.timeout)
+        if not ready:
+            self.restart()
+            return CodeResult(exit_code=124, output=f"Timeout: cell exceeded {self.timeout} seconds")
+
+        line = self._responses.readline()
+        if not line:
+            # The kernel died, most likely from the memory limit
+            self.stop()
+            return CodeResult(exit_code=1, output="Kernel died while executing the cell")
+        response = json.loads(line)
+        return CodeResult(exit_code=response["exit_code"], output=response["output"])
+
+    def _run_shell(self, code: str) -> CodeResult:
+        os.makedirs(self.work_dir, exist_ok=True)
+        try:
+            result = subprocess.run(
+                code,
+                shell=True,
+                cwd=self.work_dir,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            return CodeResult(exit_code=124, output=f"Timeout: command exceeded {self.timeout} seconds")
+        return CodeResult(exit_code=result.returncode, output=result.stdout + result.stderr)
+
+    def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> CodeResult:
+        """Execute code blocks in order, stopping at the first failure."""
+        outputs = []
+        exit_code = 0
+        for block in code_blocks:
+            language = (block.language or "").lower()
+            if language in PYTHON_LANGUAGES:
+                result = self._run_python(block.code)
+            elif language in SHELL_LANGUAGES:
+                result = self._run_shell(block.code)
+            else:
+                result = CodeResult(exit_code=1, output=f"Unsupported language: {language}")
+            outputs.append(result.output)
+            exit_code = result.exit_code
+            if exit_code != 0:
+                break
+        return CodeResult(exit_code=exit_code, output="".join(outputs))
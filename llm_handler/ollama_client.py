@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Ollama Streaming Client
+This module talks to the Ollama chat API in streaming mode so generation can
+be cut off as soon as the termination sentinel appears, tracks turn and
+token budgets for chat loops and sizes the context window per request.
+"""
+
+import json
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Callable, Dict, Any, List, Optional
+
+import requests
+from attrs import define, field
+
+from llm_handler.http_transport import default_transport
+from llm_handler.scheduler import Priority, default_scheduler
+
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_SENTINEL = "FINISH"
+# Ollama reloads a model whenever num_ctx changes, so only a few sizes are used
+CONTEXT_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt size in tokens, without loading a tokenizer."""
+    chars = sum(len(message.get("content") or "") for message in messages)
+    return chars // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS * len(messages)
+
+
+@define
+class ContextTuner:
+    """Picks ``num_ctx`` per request from a few fixed buckets.
+
+    The last bucket used per model is reused while it is at most
+    ``reuse_factor`` times larger than needed, so small requests after a big
+    one do not force a reload, yet the KV cache shrinks back eventually.
+    Output is only capped (``num_predict``) when the caller asks for it;
+    otherwise ``output_reserve`` tokens of room are kept for the reply.
+    """
+    max_context: int = 32768
+    output_reserve: int = 1024
+    reuse_factor: int = 4
+    _current: Dict[str, int] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+
+    def options_for(self, model: str, messages: List[Dict[str, Any]],
+                    max_output: Optional[int] = None) -> Dict[str, Any]:
+        needed = estimate_tokens(messages) + (max_output or self.output_reserve)
+        buckets = [b for b in CONTEXT_BUCKETS if b <= self.max_context] or [self.max_context]
+        bucket = next((b for b in buckets if b >= needed), buckets[-1])
+        with self._lock:
+            current = self._current.get(model)
+            if current and bucket <= current <= bucket * self.reuse_factor:
+                bucket = current
+            self._current[model] = bucket
+        if needed > bucket:
+            logger.warning("Prompt for %s needs ~%d tokens but num_ctx is capped at %d; it may be truncated",
+                           model, needed, bucket)
+        options = {"num_ctx": bucket}
+        if max_output:
+            options["num_predict"] = max_output
+        return options
+
+
+default_tuner = ContextTuner()
+
+
+@define
+class ChatUsage:
+    """Turns and tokens spent by one chat call, checked against its budget."""
+    max_turns: Optional[int] = None
+    max_tokens: Optional[int] = None
+    turns: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    early_stops: int = 0
+    options: Dict[str, Any] = field(factory=dict)  # Generation options of the last request
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def remaining_tokens(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        return max(0, self.max_tokens - self.total_tokens)
+
+    @property
+    def exhausted(self) -> bool:
+        turns_spent = self.max_turns is not None and self.turns >= self.max_turns
+        tokens_spent = self.max_tokens is not None and self.total_tokens >= self.max_tokens
+        return turns_spent or tokens_spent
+
+    def add(self, usage: Dict[str, Any]) -> None:
+        self.turns += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        if usage.get("terminated_early"):
+            self.early_stops += 1
+        self.options = usage.get("options", self.options)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "early_stops": self.early_stops,
+            "budget_exhausted": self.exhausted,
+            "options": self.options,
+        }
+
+
+def stream_chat(model: str,
+                messages: List[Dict[str, Any]],
+                host: str = DEFAULT_HOST,
+                options: Optional[Dict[str, Any]] = None,
+                sentinel: Optional[str] = DEFAULT_SENTINEL,
+                max_tokens: Optional[int] = None,
+                timeout: float = 600.0,
+                on_token: Optional[Callable[[str], None]] = None,
+                cancel_event: Optional[threading.Event] = None,
+                tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Stream a chat completion from Ollama, stopping early on the sentinel.
+
+    Every content chunk is passed to ``on_token`` as it arrives; setting
+    ``cancel_event`` aborts the generation. ``tools`` enables native tool
+    calling; any calls the model makes are returned in ``message.tool_calls``. Returns a dict shaped like
+    Ollama's non-streaming reply plus a ``usage`` entry, or
+    ``{"error": ...}`` on failure.
+    """
+    options = dict(options or {})
+    if max_tokens is not None:
+        options["num_predict"] = min(max_tokens, options.get("num_predict", max_tokens))
+    payload = {"model": model, "messages": messages, "stream": True}
+    if options:
+        payload["options"] = options
+    if tools:
+        payload["tools"] = tools
+
+    content_parts: List[str] = []
+    tool_calls: List[Dict[str, Any]] = []
+    chunks = 0
+    final: Dict[str, Any] = {}
+    terminated_early = False
+    try:
+        with default_transport.stream("POST", f"{host}/api/chat", json=payload, timeout=timeout) as response:
+            if response.status_code >= 400:
+                try:
+                    return {"error": response.json().get("error", response.text)}
+                except ValueError:
+                    return {"error": f"HTTP {response.status_code}: {response.text}"}
+            for line in response.iter_lines():
+                if cancel_event is not None and cancel_event.is_set():
+                    return {"error": "Request cancelled"}
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    return {"error": chunk["error"]}
+                tool_calls.extend(chunk.get("message", {}).get("tool_calls") or [])
+                piece = chunk.get("message", {}).get("content", "")
+                if piece:
+                    content_parts.append(piece)
+                    chunks += 1
+                    if on_token:
+                        on_token(piece)
+                if chunk.get("done"):
+                    final = chunk
+                    break
+                # Only the tail can complete a sentinel split across chunks
+                if sentinel and sentinel in "".join(content_parts[-len(sentinel):]):
+                    # Leaving the context manager closes the connection,
+                    # which makes Ollama abort the generation
+                    terminated_early = True
+                    break
+    except requests.RequestException as e:
+        return {"error": str(e)}
+
+    usage = {
+        # A generation cut at the sentinel never gets the final chunk; estimate instead
+        "prompt_tokens": final.get("prompt_eval_count") or estimate_tokens(messages),
+        # Ollama only reports eval_count on the final chunk; each streamed chunk is one token
+        "completion_tokens": final.get("eval_count", chunks),
+        "terminated_early": terminated_early,
+        "options": options,
+    }
+    message = {"role": "assistant", "content": "".join(content_parts)}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "model": model,
+        "message": message,
+        "done_reason": "sentinel" if terminated_early else final.get("done_reason", "stop"),
+        "usage": usage,
+    }
+
+
+class StreamingOllamaClient:
+    """Custom autogen model client backed by ``stream_chat``.
+
+    Register it on an agent with ``register_model_client`` and a shared
+    ``ChatUsage``; once the budget is exhausted it answers with the sentinel
+    so the chat's termination rule ends the loop without another inference.
+    """
+
+    def __init__(self, config: Dict[str, Any], usage: Optional[ChatUsage] = None,
+                 sentinel: str = DEFAULT_SENTINEL, priority: Priority = Priority.DEFAULT,
+                 session: str = "default", max_output: Optional[int] = None,
+                 tuner: Optional[ContextTuner] = None, cassette: Any = None, **kwargs):
+        self.model = config["model"]
+        self.host = config.get("client_host", DEFAULT_HOST)
+        self.options = config.get("options")
+        self.usage = usage if usage is not None else ChatUsage()
+        self.sentinel = sentinel
+        self.priority = priority
+        self.session = session
+        self.max_output = max_output
+        self.tuner = tuner or default_tuner
+        self.cassette = cassette  # Optional Cassette that records or replays requests
+
+    def _reply(self, content: str, usage: Dict[str, Any]) -> SimpleNamespace:
+        message = SimpleNamespace(content=content, role="assistant", function_call=None, tool_calls=None)
+        return SimpleNamespace(
+            model=self.model,
+            choices=[SimpleNamespace(message=message, finish_reason="stop")],
+            usage=usage,
+            cost=0.0,
+        )
+
+    def create(self, params: Dict[str, Any]) -> SimpleNamespace:
+        if self.usage.exhausted:
+            self.usage.early_stops += 1
+            return self._reply(f"Budget exhausted. {self.sentinel}",
+                               {"prompt_tokens": 0, "completion_tokens": 0})
+
+        model = params.get("model", self.model)
+        options = self.tuner.options_for(model, params["messages"], self.max_output)
+        options.update(self.options or {})
+        chat = self.cassette.stream_chat if self.cassette is not None else stream_chat
+        with default_scheduler.slot("ollama", self.priority, self.session):
+            response = chat(
+                model=model,
+                messages=params["messages"],
+                host=self.host,
+                options=options,
+                sentinel=self.sentinel,
+                max_tokens=self.usage.remaining_tokens,
+            )
+        if "error" in response:
+            raise RuntimeError(f"Ollama request failed: {response['error']}")
+        self.usage.add(response["usage"])
+        return self._reply(response["message"]["content"], response["usage"])
+
+    def message_retrieval(self, response: SimpleNamespace) -> List[str]:
+        return [choice.message.content for choice in response.choices]
+
+    def cost(self, response: SimpleNamespace) -> float:
+        return 0.0
+
+    @staticmethod
+    def get_usage(response: SimpleNamespace) -> Dict[str, Any]:
+        prompt_tokens = response.usage.get("prompt_tokens", 0)
+        completion_tokens = response.usage.get("completion_tokens", 0)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost": 0.0,
+            "model": response.model,
+        }
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Model Router
+This module routes chat requests through a cascade of models: a small fast
+local model first, escalating to a bigger local model or GPT only when the
+reply fails validation or looks unconfident.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from attrs import define, field
+
+
+logger = logging.getLogger(__name__)
+
+# Returns (ok, reason) for a reply message
+Validator = Callable[[Dict[str, Any]], Tuple[bool, str]]
+
+CODE_BLOCK_PATTERN = re.compile(r"```(?:json)?\s*([\s\S]+?)```")
+HEDGING_PATTERN = re.compile(
+    r"\b(i'?m not sure|i am not sure|i don'?t know|i cannot|i can'?t help|unclear|as an ai)\b",
+    re.IGNORECASE,
+)
+COMPLEX_PATTERN = re.compile(
+    r"\b(write|implement|build|design|architecture|refactor|debug|explain why|optimi[sz]e|plan)\b",
+    re.IGNORECASE,
+)
+
+
+def validate_action_calls(text: str, known_actions) -> Tuple[bool, str]:
+    """Check that JSON code blocks in a reply are well-formed action calls."""
+    for block in CODE_BLOCK_PATTERN.findall(text):
+        block = block.strip()
+        if not block.startswith("{"):
+            continue
+        try:
+            data = json.loads(block)
+        except json.JSONDecodeError:
+            return False, "invalid JSON in action block"
+        name = data.get("action_type")
+        if name not in known_actions:
+            name = next((key for key in data if key in known_actions), None)
+        if name is None:
+            return False, "action block names no known action"
+        if not isinstance(data.get(name, {}), dict):
+            return False, f"parameters for '{name}' are not an object"
+    return True, ""
+
+
+def validate_tool_calls(tool_calls: List[Dict[str, Any]], known_actions) -> Tuple[bool, str]:
+    """Check that native tool calls name known actions with object arguments."""
+    for call in tool_calls:
+        function = call.get("function", {})
+        if function.get("name") not in known_actions:
+            return False, f"tool call names unknown action '{function.get('name')}'"
+        arguments = function.get("arguments", {})
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments or "{}")
+            except json.JSONDecodeError:
+                return False, "invalid JSON in tool call arguments"
+        if not isinstance(arguments, dict):
+            return False, "tool call arguments are not an object"
+    return True, ""
+
+
+def estimate_confidence(text: str, response: Dict[str, Any]) -> float:
+    """Cheap 0..1 confidence estimate for a reply without logprobs."""
+    if response.get("message", {}).get("tool_calls"):
+        return 1.0  # Structured calls are checked by the validator instead
+    if not text.strip():
+        return 0.0
+    score = 1.0
+    if response.get("done_reason") == "length":
+        score -= 0.5  # Truncated by the output limit
+    if HEDGING_PATTERN.search(text):
+        score -= 0.5
+    if len(text.strip()) < 5:
+        score -= 0.3
+    return max(0.0, score)
+
+
+@define
+class Tier:
+    """One step of the cascade."""
+    name: str
+    model: str
+    backend: str = "ollama"  # "ollama" or "openai"
+    max_output: Optional[int] = None  # Reply length cap; a truncated reply lowers confidence and escalates
+
+
+@define
+class TierStats:
+    attempts: int = 0
+    accepted: int = 0
+    escalated: int = 0
+    errors: int = 0
+    fallbacks: int = 0  # Escalated replies served anyway because every later tier failed
+
+    @property
+    def hit_rate(self) -> float:
+        return self.accepted / self.attempts if self.attempts else 0.0
+
+
+@define
+class ModelRouter:
+    """Tries tiers in order and returns the first reply that passes the checks.
+
+    Requests classified as complex skip straight to ``complex_start_tier``.
+    A reply is accepted when it passes the optional validator and its
+    estimated confidence reaches ``min_confidence``; the last tier's reply is
+    always accepted.
+    """
+    ollama: Any  # OllamaHandler used for the local tiers
+    tiers: List[Tier]
+    min_confidence: float = 0.6
+    simple_max_chars: int = 200
+    complex_start_tier: int = 1
+    gpt: Any = None  # GPTHandler, created on first use of an "openai" tier
+    _stats: Dict[str, TierStats] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+
+    def classify(self, messages: List[Dict[str, Any]]) -> str:
+        """Label a request 'simple' or 'complex' from its last user message."""
+        user_messages = [m for m in messages if m.get("role") == "user"]
+        text = user_messages[-1].get("content", "") if user_messages else ""
+        if len(text) > self.simple_max_chars or COMPLEX_PATTERN.search(text):
+            return "complex"
+        return "simple"
+
+    def _ask_gpt(self, tier: Tier, messages: List[Dict[str, Any]],
+                 tools: Optional[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        if self.gpt is None:
+            # Imported lazily: the openai package is only needed for this tier
+            from llm_handler.ask_gpt import GPTHandler
+            self.gpt = GPTHandler(model=tier.model)
+        return self.gpt.chat(messages, tools=tools)
+
+    def _record(self, tier: Tier, outcome: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(tier.name, TierStats())
+            stats.attempts += 1
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+
+    def chat(self, messages: List[Dict[str, Any]], validator: Optional[Validator] = None,
+             tools: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Route a chat request through the cascade."""
+        kind = self.classify(messages)
+        start = min(self.complex_start_tier, len(self.tiers) - 1) if kind == "complex" else 0
+        response: Dict[str, Any] = {"error": "No model tiers configured"}
+        # Best escalated reply, served if every later tier fails: (passed validation, confidence, tier, reply)
+        fallback: Optional[Tuple[bool, float, Tier, Dict[str, Any]]] = None
+
+        for index in range(start, len(self.tiers)):
+            tier = self.tiers[index]
+            is_last = index == len(self.tiers) - 1
+            if tier.backend == "openai":
+                response = self._ask_gpt(tier, messages, tools)
+            else:
+                response = self.ollama.chat(messages=messages, model=tier.model, tools=tools,
+                                            max_output=tier.max_output)
+
+            if "error" in response:
+                self._record(tier, "errors")
+                logger.info("router: %s request failed on tier %s: %s", kind, tier.name, response["error"])
+                continue
+
+            text = response.get("message", {}).get("content", "")
+            ok, reason = validator(response.get("message", {})) if validator else (True, "")
+            confidence = estimate_confidence(text, response)
+            if not ok or confidence < self.min_confidence:
+                reason = reason or f"confidence {confidence:.2f} below {self.min_confidence}"
+                if not is_last:
+                    self._record(tier, "escalated")
+                    logger.info("router: escalating %s request from tier %s: %s", kind, tier.name, reason)
+                    if fallback is None or (ok, confidence) >= fallback[:2]:
+                        fallback = (ok, confidence, tier, response)
+                    continue
+
+            self._record(tier, "accepted")
+            logger.info("router: %s request served by tier %s", kind, tier.name)
+            response["tier"] = tier.name
+            return response
+
+        if fallback is not None:
+            _, _, tier, response = fallback
+            logger.info("router: later tiers failed, serving %s request from tier %s", kind, tier.name)
+            with self._lock:
+                self._stats[tier.name].fallbacks += 1
+            response["tier"] = tier.name
+        return response
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-tier attempts, outcomes and hit rates, for tuning thresholds."""
+        with self._lock:
+            return {
+                name: {
+                    "attempts": s.attempts,
+                    "accepted": s.accepted,
+                    "escalated": s.escalated,
+                    "errors": s.errors,
+                    "fallbacks": s.fallbacks,
+                    "hit_rate": round(s.hit_rate, 3),
+                }
+                for name, s in self._stats.items()
+            }
+
+
+def default_tiers(small_model: str, large_model: str, gpt_model: str = "o1") -> List[Tier]:
+    """Small local model, then the large local model, then GPT if a key is configured."""
+    # The small tier only serves short, simple replies; anything longer belongs to the large one
+    tiers = [Tier(name="small", model=small_model, max_output=1024), Tier(name="large", model=large_model)]
+    if os.environ.get("GPT_API_KEY"):
+        tiers.append(Tier(name="gpt", model=gpt_model, backend="openai"))
+    return tiers
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+LLM Scheduler
+This module arbitrates access to LLM backends: requests wait in per-backend
+queues ordered by priority class, sessions share capacity fairly and queue
+waits are recorded so interactive latency can be monitored.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Deque, Dict, Any, Iterator, List, Optional
+
+from attrs import define, field
+
+
+class Priority(IntEnum):
+    """Priority classes; lower values are served first."""
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BATCH = 2
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a backend queue has no room for another request."""
+
+
+@define
+class BackendLimits:
+    """Concurrency and queue limits for one backend."""
+    max_concurrency: int = 1
+    max_queue: int = 64
+    # Cap on batch requests running at once, so they cannot take every slot
+    max_batch_concurrency: Optional[int] = None
+
+
+@define
+class _Ticket:
+    priority: Priority
+    session: str
+    seq: int
+    enqueued: float
+    granted: bool = False
+
+
+@define
+class _BackendState:
+    limits: BackendLimits
+    condition: threading.Condition = field(factory=threading.Condition)
+    waiting: List[_Ticket] = field(factory=list)
+    running: int = 0
+    running_batch: int = 0
+    # Slots granted per session with queued or running work; idle sessions are dropped
+    served: Dict[str, int] = field(factory=dict)
+    active: Dict[str, int] = field(factory=dict)  # Queued plus running requests per session
+    waits: Dict[Priority, Deque[float]] = field(factory=lambda: {p: deque(maxlen=1000) for p in Priority})
+    rejected: int = 0
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@define
+class LLMScheduler:
+    """Grants backend slots by priority, then by least-served session."""
+    limits: Dict[str, BackendLimits] = field(factory=dict)
+    default_limits: BackendLimits = field(factory=BackendLimits)
+    _states: Dict[str, _BackendState] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+    _seq: int = field(default=0, init=False)
+
+    def _state(self, backend: str) -> _BackendState:
+        with self._lock:
+            state = self._states.get(backend)
+            if state is None:
+                state = self._states[backend] = _BackendState(limits=self.limits.get(backend, self.default_limits))
+            return state
+
+    @staticmethod
+    def _join(state: _BackendState, session: str) -> None:
+        """Count a new request for ``session``. Caller holds the condition."""
+        if session not in state.active:
+            # Start level with the least-served active session, so a newcomer neither
+            # starves the sessions already running nor waits behind their history
+            state.served[session] = min(state.served.values(), default=0)
+            state.active[session] = 0
+        state.active[session] += 1
+
+    @staticmethod
+    def _leave(state: _BackendState, session: str) -> None:
+        """Forget a finished or abandoned request. Caller holds the condition."""
+        state.active[session] -= 1
+        if not state.active[session]:
+            del state.active[session]
+            del state.served[session]
+
+    def _dispatch(self, state: _BackendState) -> None:
+        """Grant free slots to the best waiting tickets. Caller holds the condition."""
+        limits = state.limits
+        while state.waiting and state.running < limits.max_concurrency:
+            batch_full = (limits.max_batch_concurrency is not None
+                          and state.running_batch >= limits.max_batch_concurrency)
+            eligible = [t for t in state.waiting if not (batch_full and t.priority == Priority.BATCH)]
+            if not eligible:
+                break
+            ticket = min(eligible, key=lambda t: (t.priority, state.served.get(t.session, 0), t.seq))
+            state.waiting.remove(ticket)
+            state.running += 1
+            if ticket.priority == Priority.BATCH:
+                state.running_batch += 1
+            state.served[ticket.session] = state.served.get(ticket.session, 0) + 1
+            ticket.granted = True
+        state.condition.notify_all()
+
+    @contextmanager
+    def slot(self, backend: str, priority: Priority = Priority.DEFAULT,
+             session: str = "default", timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold a backend slot for the duration of the ``with`` block."""
+        state = self._state(backend)
+        with state.condition:
+            if len(state.waiting) >= state.limits.max_queue:
+                state.rejected += 1
+                raise QueueFullError(f"Queue for backend '{backend}' is full")
+            with self._lock:
+                self._seq += 1
+                seq = self._seq
+            ticket = _Ticket(priority=Priority(priority), session=session, seq=seq, enqueued=time.monotonic())
+            state.waiting.append(ticket)
+            self._join(state, session)
+            self._dispatch(state)
+
+            deadline = ticket.enqueued + timeout if timeout is not None else None
+            while not ticket.granted:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    state.waiting.remove(ticket)
+                    self._leave(state, session)
+                    raise TimeoutError(f"Timed out waiting for backend '{backend}'")
+                state.condition.wait(remaining)
+            state.waits[ticket.priority].append(time.monotonic() - ticket.enqueued)
+
+        try:
+            yield
+        finally:
+            with state.condition:
+                state.running -= 1
+                if ticket.priority == Priority.BATCH:
+                    state.running_batch -= 1
+                self._leave(state, session)
+                self._dispatch(state)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, running count and queue-wait statistics per backend."""
+        with self._lock:
+            states = dict(self._states)
+        report = {}
+        for backend, state in states.items():
+            with state.condition:
+                waits = {}
+                for priority, samples in state.waits.items():
+                    samples = list(samples)
+                    waits[priority.name.lower()] = {
+                        "count": len(samples),
+                        "p50": round(_percentile(samples, 0.5), 3),
+                        "p95": round(_percentile(samples, 0.95), 3),
+                        "max": round(max(samples, default=0.0), 3),
+                    }
+                report[backend] = {
+                    "running": state.running,
+                    "queued": len(state.waiting),
+                    "active_sessions": len(state.active),
+                    "rejected": state.rejected,
+                    "queue_wait": waits,
+                }
+        return report
+
+
+# A local Ollama serves one generation at a time per GPU; hosted APIs take more
+default_scheduler = LLMScheduler(limits={
+    "ollama": BackendLimits(max_concurrency=1, max_queue=64),
+    "openai": BackendLimits(max_concurrency=8, max_queue=256, max_batch_concurrency=6),
+})
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Single Flight
+This module coalesces identical in-flight LLM requests: the first caller
+starts the inference and every concurrent caller with the same request key
+shares its streamed tokens and final result.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from attrs import define, field
+
+
+TokenCallback = Callable[[str], None]
+# Receives a token emitter and a cancellation event, returns the final result
+FlightFunction = Callable[[TokenCallback, threading.Event], Any]
+
+
+def request_key(*parts: Any) -> str:
+    """Build a stable key from the backend, model, messages and settings."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@define
+class _Flight:
+    condition: threading.Condition = field(factory=threading.Condition)
+    cancelled: threading.Event = field(factory=threading.Event)
+    tokens: List[str] = field(factory=list)
+    waiters: int = 0
+    done: bool = False
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+@define
+class SingleFlight:
+    """Shares one in-flight call among all concurrent callers with the same key.
+
+    The call runs on its own thread, so any caller, including the one that
+    started it, can drop out (timeout or failing token callback) without
+    affecting the others. When the last caller drops out the call is asked
+    to stop through its cancellation event.
+    """
+    _flights: Dict[str, _Flight] = field(factory=dict, init=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False)
+    stats: Dict[str, int] = field(factory=lambda: {"started": 0, "coalesced": 0, "cancelled": 0}, init=False)
+
+    def _start(self, key: str, flight: _Flight, fn: FlightFunction) -> None:
+        def emit(token: str) -> None:
+            with flight.condition:
+                flight.tokens.append(token)
+                flight.condition.notify_all()
+
+        def target() -> None:
+            try:
+                result, error = fn(emit, flight.cancelled), None
+            except BaseException as e:
+                result, error = None, e
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.condition:
+                flight.result, flight.error, flight.done = result, error, True
+                flight.condition.notify_all()
+
+        threading.Thread(target=target, name=f"single-flight-{key[:8]}", daemon=True).start()
+
+    def _leave(self, key: str, flight: _Flight) -> None:
+        with flight.condition:
+            flight.waiters -= 1
+            abandoned = flight.waiters == 0 and not flight.done
+        if abandoned:
+            flight.cancelled.set()
+            with self._lock:
+                self.stats["cancelled"] += 1
+                # New callers must not join a call that is being cancelled
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def run(self, key: str, fn: FlightFunction,
+            on_token: Optional[TokenCallback] = None,
+            timeout: Optional[float] = None) -> Any:
+        """Run ``fn`` once per key, streaming its tokens to every waiter."""
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[key] = _Flight()
+                self.stats["started"] += 1
+            else:
+                self.stats["coalesced"] += 1
+            with flight.condition:
+                flight.waiters += 1
+        if is_leader:
+            self._start(key, flight, fn)
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        delivered = 0
+        try:
+            while True:
+                with flight.condition:
+                    while delivered == len(flight.tokens) and not flight.done:
+                        remaining = deadline - time.monotonic() if deadline is not None else None
+                        if remaining is not None and remaining <= 0:
+                            raise TimeoutError("Timed out waiting for the shared LLM request")
+                        flight.condition.wait(remaining)
+                    pending = flight.tokens[delivered:]
+                    delivered += len(pending)
+                    finished = flight.done
+                # Deliver outside the lock so a slow consumer does not block the producer
+                if on_token:
+                    for token in pending:
+                        on_token(token)
+                if finished and delivered == len(flight.tokens):
+                    break
+        except BaseException:
+            self._leave(key, flight)
+            raise
+
+        with flight.condition:
+            flight.waiters -= 1
+        if flight.error is not None:
+            raise flight.error
+        # Every caller gets its own copy so nobody mutates a shared result
+        return copy.deepcopy(flight.result)
+
+
+# Shared by all handlers so identical requests from different sessions coalesce
+default_flights = SingleFlight()